@@ -3,17 +3,25 @@
 # License: Apache 2.0
 # Summary: script that calculates various language errors of the language used in the documents being processed
 
-import sys
-import boto3
+import bisect
 import json
 import os
-import uuid
+import collections
+import queue
+import socket
+import time
 import language_tool_python as langtool
+import analysis_cache
+import analysis_job
+import sentence_cache
+import work_queue
 
+from language_tool_python.download_lt import LATEST_VERSION as LANGUAGETOOL_VERSION, download_lt
+from concurrent.futures import ThreadPoolExecutor
 
-REGION = os.environ['AWS_REGION']
 
 ANALYSIS_FOLDER_NAME = 'errors'
+SUMMARIES_FOLDER_NAME = 'error-summaries'
 KEY_ID = 'id'
 KEY_TEXT = 'text'
 
@@ -21,48 +29,470 @@ SSM_PARAMS_PATH = 'language-analysis'
 CONFIG_PARAM_ANALYSIS_RESULTS_BUCKET = '/{}/analysisResultsBucket'.format(SSM_PARAMS_PATH)
 CONFIG_PARAM_SPACY_MODE = '/{}/spaCyMode'.format(SSM_PARAMS_PATH)
 CONFIG_PARAM_LANGUAGE = '/{}/language'.format(SSM_PARAMS_PATH)
+CONFIG_PARAM_ERRORS_PROFILE = '/{}/errorsProfile'.format(SSM_PARAMS_PATH)
+CONFIG_PARAM_ERRORS_PROFILE_BY_SOURCE = '/{}/errorsProfileBySource'.format(SSM_PARAMS_PATH)
 
+# Rules checked by LanguageTool in each profile, through its enabled and disabled categories and rules. If
+# enabled_only is set, only the enabled categories and rules are checked
+ERRORS_PROFILES = {
+    'full': {},
+    'no-style': {
+        'disabled_categories': ['STYLE', 'REDUNDANCY', 'PLAIN_ENGLISH', 'REPETITIONS_STYLE', 'TEXT_ANALYSIS',
+                                'CREATIVE_WRITING']
+    },
+    'spelling+grammar': {
+        'enabled_categories': ['TYPOS', 'GRAMMAR', 'CONFUSED_WORDS'],
+        'enabled_only': True
+    },
+    'typography-only': {
+        'enabled_categories': ['TYPOGRAPHY', 'PUNCTUATION'],
+        'enabled_only': True
+    }
+}
 
-def retrieve_file_contents(bucket: str, key: str) -> str:
-    client = boto3.client('s3', region_name=REGION)
-    response = client.get_object(Bucket=bucket, Key=key)
-    return response['Body'].read().decode('utf-8')
+# When the job runs as a child of an AWS Batch array job, each child analyses one shard of the files and uploads its
+# results to the partial results bucket, from which they are merged once all the children finish
+ENV_PARTIAL_RESULTS_BUCKET = 'PARTIAL_RESULTS_BUCKET'
 
+# Documents can be checked together, joined by a paragraph break, in requests of up to this number of characters.
+# Longer documents are checked on their own. Rules that look at the whole text may then report errors that depend on
+# the neighbouring documents, so by default (0) each document is checked on its own
+LANGUAGETOOL_BATCH_CHARACTERS = int(os.environ.get('LANGUAGETOOL_BATCH_CHARACTERS', 0))
+LANGUAGETOOL_BATCH_MAX_DOCUMENTS = 1000
+DOCUMENT_SEPARATOR = '\n\n'
 
-def upload_contents(bucket: str, key: str, contents: str):
-    client = boto3.client('s3', region_name=REGION)
+# Number of LanguageTool servers started by the job, and maximum number of requests sent to them at the same time
+LANGUAGETOOL_SERVERS = int(os.environ.get('LANGUAGETOOL_SERVERS', 1))
+LANGUAGETOOL_MAX_PENDING_CHECKS = int(os.environ.get('LANGUAGETOOL_MAX_PENDING_CHECKS', 2 * LANGUAGETOOL_SERVERS))
 
-    return client.put_object(
-        Body=contents.encode('ascii'),
-        Bucket=bucket,
-        Key=key
-    )
+# Options of the JVMs of the LanguageTool servers (e.g. heap size), and class data sharing archive created when the
+# image is built. The servers start faster if the archive exists
+LANGUAGETOOL_JVM_OPTIONS = os.environ.get('LANGUAGETOOL_JVM_OPTIONS', '')
+LANGUAGETOOL_CDS_ARCHIVE = os.environ.get('LANGUAGETOOL_CDS_ARCHIVE')
 
+# Maximum number of examples of the errors of each rule stored for each document. 0 stores no examples, only the
+# summaries of the errors of the documents
+ERROR_EXAMPLES_PER_RULE = int(os.environ.get('ERROR_EXAMPLES_PER_RULE', 3))
 
-def generate_results_key(key: str) -> str:
+# Number of rules with most errors included in the summary of the errors of each document
+ERROR_SUMMARY_TOP_RULES = 5
+
+# Characters of text around each error included in its context, as the LanguageTool server does, which replaces line
+# breaks, carriage returns and tabs in the context by spaces
+LANGUAGETOOL_CONTEXT_SIZE = 40
+LANGUAGETOOL_CONTEXT_WHITESPACE = str.maketrans('\n\r\t', '   ')
+
+# Stages of the job whose time is measured, besides the ones measured by analysis_job (SSM, S3 download, JSON parse,
+# serialisation and upload)
+STAGE_MODEL_LOAD = 'model_load'
+STAGE_LANGUAGE_CHECK = 'language_check'
+STAGE_CACHE = 'cache'
+
+timings = analysis_job.timings
+
+
+def generate_results_key(key: str, folder: str = ANALYSIS_FOLDER_NAME) -> str:
     components = key.split('/')
-    components.insert(-1, ANALYSIS_FOLDER_NAME)
+    components.insert(-1, folder)
     return '/'.join(components)
 
 
-def get_parameter(name: str):
-    client = boto3.client('ssm', region_name=REGION)
-    return client.get_parameter(Name=name)['Parameter']['Value']
+def generate_partial_results_key(run_id: str, key: str, index: int, folder: str = ANALYSIS_FOLDER_NAME) -> str:
+    # Shards are merged in the order of their keys
+    return '{}/{}/{}/{:05d}'.format(run_id, folder, key, index)
 
 
-def analyse_document_text(checker, document: dict) -> [dict]:
-    text = document[KEY_TEXT]
-    matches = checker.check(text)
+class LanguageToolPool:
+    """
+    Group of LanguageTool servers that check texts at the same time. Each check is sent to one of the servers that are
+    not busy, waiting for one to be released if all of them are
+    """
+
+    def __init__(self, checkers: list):
+        self.size = len(checkers)
+        self.checkers = checkers
+        self.__available = queue.Queue()
+
+        for checker in checkers:
+            self.__available.put(checker)
+
+    def check(self, text: str):
+        checker = self.__available.get()
+
+        try:
+            return checker.check(text)
+        finally:
+            self.__available.put(checker)
+
+    def close(self):
+        for checker in self.checkers:
+            checker.close()
+
+
+def configure_jvm(options: str = LANGUAGETOOL_JVM_OPTIONS, archive: str = LANGUAGETOOL_CDS_ARCHIVE):
+    """
+    Sets the options of the JVMs started afterwards through JAVA_TOOL_OPTIONS, as language_tool_python starts the
+    servers with a fixed command
+    :param options: JVM options
+    :param archive: path of the class data sharing archive to use, ignored if it does not exist
+    """
+    flags = [os.environ.get('JAVA_TOOL_OPTIONS', '')]
+
+    if archive and os.path.isfile(archive):
+        flags.append('-XX:SharedArchiveFile={} -Xshare:auto'.format(archive))
+
+    flags.append(options)
+    os.environ['JAVA_TOOL_OPTIONS'] = ' '.join(flag for flag in flags if flag)
+
+
+class LanguageToolServer(langtool.LanguageTool):
+    """
+    LanguageTool instance whose server listens on the given port. language_tool_python keeps the port of the next
+    server in a class attribute, so each instance would otherwise first try a port already taken by another server
+    """
+
+    def __init__(self, language: str, port: int):
+        self._port = port
+        super().__init__(language)
+
+
+def find_free_ports(count: int) -> [int]:
+    """
+    :param count: number of ports to find
+    :return: list of ports in the range used by language_tool_python that no process is listening on
+    """
+    ports = []
+
+    for port in range(langtool.LanguageTool._MIN_PORT, langtool.LanguageTool._MAX_PORT + 1):
+        if len(ports) == count:
+            break
+
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            try:
+                probe.bind((langtool.LanguageTool._HOST, port))
+            except OSError:
+                continue
+
+        ports.append(port)
+
+    if len(ports) < count:
+        raise RuntimeError('Only {} free ports found for {} LanguageTool servers'.format(len(ports), count))
+
+    return ports
+
+
+def start_language_tool_pool(language: str, servers: int) -> LanguageToolPool:
+    """
+    Starts the servers of the pool at the same time, each one listening on its own free port
+    """
+    # LanguageTool is downloaded, if it is not installed, before the servers are started
+    download_lt()
+
+    with ThreadPoolExecutor(max_workers=servers) as executor:
+        starting = [executor.submit(LanguageToolServer, language, port) for port in find_free_ports(servers)]
+
+    checkers = []
+    error = None
+
+    for future in starting:
+        try:
+            checkers.append(future.result())
+        except Exception as e:
+            error = error or e
+
+    # The servers that started are stopped if any of them fails
+    if error is not None:
+        LanguageToolPool(checkers).close()
+        raise error
+
+    return LanguageToolPool(checkers)
+
+
+def apply_profile(checker, profile: str):
+    """
+    Sets the rules checked by LanguageTool in the following checks
+    :param checker: LanguageTool instance or pool of instances
+    :param profile: name of one of the profiles of ERRORS_PROFILES
+    """
+    rules = ERRORS_PROFILES[profile]
+
+    for instance in getattr(checker, 'checkers', [checker]):
+        instance.enabled_categories = set(rules.get('enabled_categories', []))
+        instance.disabled_categories = set(rules.get('disabled_categories', []))
+        instance.enabled_rules = set(rules.get('enabled_rules', []))
+        instance.disabled_rules = set(rules.get('disabled_rules', []))
+        instance.enabled_rules_only = rules.get('enabled_only', False)
+
+
+def get_profiles() -> (str, dict):
+    """
+    Retrieves from SSM the errors profile of the deployment and the profiles of the sources that use a different one
+    :return: tuple with the default profile and a dictionary with the profile of each source
+    """
+    default_profile = analysis_job.get_parameter(CONFIG_PARAM_ERRORS_PROFILE)
+    profile_by_source = json.loads(analysis_job.get_parameter(CONFIG_PARAM_ERRORS_PROFILE_BY_SOURCE))
+
+    for profile in [default_profile, *profile_by_source.values()]:
+        if profile not in ERRORS_PROFILES:
+            raise ValueError('Unknown errors profile {}. It must be one of: {}'.format(
+                profile, ', '.join(ERRORS_PROFILES)))
+
+    return default_profile, profile_by_source
+
+
+def select_profile(key: str, default_profile: str, profile_by_source: dict) -> str:
+    # The root folder of the data source files is their source
+    return profile_by_source.get(key.split('/')[0], default_profile)
+
+
+def build_error(match, context: str) -> dict:
+    return {
+        'rule-id': match.ruleId,
+        'category': match.category,
+        'type': match.ruleIssueType,
+        'context': context,
+        'replacement': match.replacements[0] if match.replacements else ''
+    }
+
+
+def find_language_errors(checker, text: str) -> [dict]:
+    with timings.stage(STAGE_LANGUAGE_CHECK):
+        matches = checker.check(text)
+
+    return [build_error(match, match.context) for match in matches]
+
+
+def utf16_length(text: str) -> int:
+    # LanguageTool runs on Java, whose string offsets count UTF-16 code units
+    return len(text.encode('utf-16-le')) // 2
+
+
+def build_context(text: str, from_pos: int, to_pos: int) -> str:
+    """
+    Builds the context of an error the same way the LanguageTool server does: the error and up to
+    LANGUAGETOOL_CONTEXT_SIZE characters at each side, with ellipses where the text is cut and line breaks, carriage
+    returns and tabs replaced by spaces
+    :param from_pos: offset of the error in UTF-16 code units
+    :param to_pos: offset of the end of the error in UTF-16 code units
+    """
+    units = text.translate(LANGUAGETOOL_CONTEXT_WHITESPACE).encode('utf-16-le')
+    length = len(units) // 2
+    start = from_pos - LANGUAGETOOL_CONTEXT_SIZE
+    end = to_pos + LANGUAGETOOL_CONTEXT_SIZE
+
+    context = units[max(start, 0) * 2:min(end, length) * 2].decode('utf-16-le', errors='surrogatepass')
+
+    # The ellipses are added unless the window goes beyond the text, even if it ends exactly at its boundaries
+    return '{}{}{}'.format('...' if start >= 0 else '', context, '...' if end <= length else '')
+
+
+def locate_matches(checker, texts: [str]) -> [[tuple]]:
+    """
+    Checks several texts with a single LanguageTool request, joining them with a paragraph break, and finds the text
+    that contains each match. Matches that span the break between two texts are discarded
+    :return: list with the matches of each text, as tuples with the match and its start and end offsets in the text (in
+    UTF-16 code units)
+    """
+    lengths = [utf16_length(text) for text in texts]
+    starts = []
+    position = 0
+
+    for length in lengths:
+        starts.append(position)
+        position += length + len(DOCUMENT_SEPARATOR)
+
+    with timings.stage(STAGE_LANGUAGE_CHECK):
+        matches = checker.check(DOCUMENT_SEPARATOR.join(texts))
+
+    located = [[] for _ in texts]
+
+    for match in matches:
+        i = bisect.bisect_right(starts, match.offset) - 1
+        from_pos = match.offset - starts[i]
+        to_pos = from_pos + match.errorLength
+
+        if to_pos <= lengths[i]:
+            located[i].append((match, from_pos, to_pos))
+
+    return located
+
+
+def find_language_errors_in_batch(checker, texts: [str]) -> [[dict]]:
+    """
+    Checks several texts with a single LanguageTool request and maps each error back to the text that contains it.
+    Errors whose context includes other texts get it rebuilt from their own text
+    :return: list with the errors of each text
+    """
+    if len(texts) == 1:
+        return [find_language_errors(checker, texts[0])]
+
+    errors = []
+
+    for text, matches in zip(texts, locate_matches(checker, texts)):
+        length = utf16_length(text)
+
+        errors.append([build_error(match, match.context
+                                   if from_pos >= LANGUAGETOOL_CONTEXT_SIZE
+                                   and to_pos + LANGUAGETOOL_CONTEXT_SIZE <= length
+                                   else build_context(text, from_pos, to_pos))
+                       for match, from_pos, to_pos in matches])
+
+    return errors
+
+
+def find_sentence_errors(checker, sentences: [str]) -> ([[dict]], float):
+    """
+    Checks sentences with a single LanguageTool request. Errors are described by their offsets in the sentence instead
+    of their context, so that they can be placed in any text that contains the sentence
+    :return: tuple with the errors of each sentence and the seconds taken by the check
+    """
+    start = time.perf_counter()
+    errors = [[{
+        'rule-id': match.ruleId,
+        'category': match.category,
+        'type': match.ruleIssueType,
+        'replacement': match.replacements[0] if match.replacements else '',
+        'offset': from_pos,
+        'length': to_pos - from_pos
+    } for match, from_pos, to_pos in matches] for matches in locate_matches(checker, sentences)]
+
+    return errors, time.perf_counter() - start
+
+
+def plan_sentence_checks(sentences, texts: [str], in_flight: dict) -> ([list], [str], dict):
+    """
+    Splits texts into sentences and looks up the errors of each sentence
+    :param sentences: cache of the errors of the sentences
+    :param in_flight: dictionary with the check and the index in it of the sentences sent to LanguageTool by previous
+    batches whose errors are not cached yet
+    :return: tuple with the sentences of each text, as tuples with the offset of the sentence in the text (in UTF-16
+    code units), the sentence and its cached errors (None if not cached), the list of distinct sentences to check, and
+    a dictionary with the check and index of the sentences that wait for the check of a previous batch
+    """
+    plans = []
+    missing = {}
+    waiting = {}
+
+    for text in texts:
+        plan = []
+        position = 0
+        units = 0
+
+        for start, sentence in sentence_cache.split_sentences(text):
+            units += utf16_length(text[position:start])
+            position = start
 
-    return [
-        {
+            with timings.stage(STAGE_CACHE):
+                errors = sentences.get(sentence)
+
+            if errors is None:
+                if sentence in in_flight:
+                    waiting[sentence] = in_flight[sentence]
+                else:
+                    missing[sentence] = None
+
+            plan.append((units, sentence, errors))
+
+        plans.append(plan)
+
+    return plans, list(missing), waiting
+
+
+def resolve_sentence_checks(sentences, texts: [str], plans: [list], missing: [str], waiting: dict,
+                            checked) -> [[dict]]:
+    """
+    Caches the errors of the checked sentences and places the errors of all the sentences in their texts
+    :param waiting: dictionary with the check of a previous batch and the index in it of the sentences that wait for it
+    :param checked: value returned by find_sentence_errors for the missing sentences
+    :return: list with the errors of each text
+    """
+    found, seconds = checked if missing else ([], 0)
+    sentences.record_check(sum(len(sentence) for sentence in missing), seconds)
+
+    with timings.stage(STAGE_CACHE):
+        for sentence, errors in zip(missing, found):
+            sentences.put(sentence, errors)
+
+    found = dict(zip(missing, found))
+
+    # Batches are resolved in order, so the checks of the previous batches are already finished
+    for sentence, (check, index) in waiting.items():
+        found[sentence] = check.result()[0][index]
+    results = []
+
+    for text, plan in zip(texts, plans):
+        errors = []
+
+        for units, sentence, sentence_errors in plan:
+            for error in found[sentence] if sentence_errors is None else sentence_errors:
+                from_pos = units + error['offset']
+
+                errors.append({
+                    'rule-id': error['rule-id'],
+                    'category': error['category'],
+                    'type': error['type'],
+                    'context': build_context(text, from_pos, from_pos + error['length']),
+                    'replacement': error['replacement']
+                })
+
+        results.append(errors)
+
+    return results
+
+
+def batch_lookups(lookups, max_characters: int):
+    """
+    Groups documents so that the ones whose errors are not cached can be checked together
+    :param lookups: iterable of tuples with each document and its cached errors (None if not cached)
+    :param max_characters: maximum number of characters of the documents to check in each group, unless a single
+    document exceeds it
+    :return: generator of lists of tuples with each document and its cached errors, in the same order
+    """
+    batch = []
+    size = 0
+
+    for document, errors in lookups:
+        if errors is None:
+            length = len(document[KEY_TEXT])
+
+            if size and size + length > max_characters:
+                yield batch
+                batch = []
+                size = 0
+
+            size += length + len(DOCUMENT_SEPARATOR)
+
+        batch.append((document, errors))
+
+        if len(batch) >= LANGUAGETOOL_BATCH_MAX_DOCUMENTS:
+            yield batch
+            batch = []
+            size = 0
+
+    if batch:
+        yield batch
+
+
+def build_error_records(document: dict, errors: [dict], max_per_rule: int = None) -> [dict]:
+    """
+    :param max_per_rule: maximum number of errors of each rule included, or None to include all of them
+    :return: list of errors with the fields of the document they belong to. Their identifiers are derived from the
+    document, the rule and the number of the error, so analysing a document again replaces its errors
+    """
+    records = []
+    rule_counts = {}
+
+    for error in errors:
+        count = rule_counts.get(error['rule-id'], 0)
+        rule_counts[error['rule-id']] = count + 1
+
+        if max_per_rule is not None and count >= max_per_rule:
+            continue
+
+        records.append({
             # Error specific fields
-            'rule-id': match.ruleId,
-            'category': match.category,
-            'type': match.ruleIssueType,
-            'context': match.context,
-            'replacement': match.replacements[0] if match.replacements else '',
-            KEY_ID: str(uuid.uuid4()),
+            **error,
+            KEY_ID: '{}:{}:{}'.format(document[KEY_ID], error['rule-id'], count),
 
             # Fields inherited from the document
             'country': document['country'],
@@ -70,36 +500,211 @@ def analyse_document_text(checker, document: dict) -> [dict]:
             'date': document['date'],
             'document-id': document[KEY_ID],
             'source': document['source']
-        } for match in matches]
+        })
+
+    return records
+
+
+def summarise_errors(document: dict, errors: [dict]) -> dict:
+    """
+    :return: the summary of the errors of a document, merged into the document when indexed
+    """
+    rule_counts = collections.Counter(error['rule-id'] for error in errors)
+
+    return {
+        KEY_ID: document[KEY_ID],
+        'language-errors': {
+            'count': len(errors),
+            'categories': dict(collections.Counter(error['category'] for error in errors)),
+            'types': dict(collections.Counter(error['type'] for error in errors)),
+            'top-rules': [{'rule-id': rule, 'count': count}
+                          for rule, count in rule_counts.most_common(ERROR_SUMMARY_TOP_RULES)]
+        }
+    }
+
+
+def analyse_document_text(checker, document: dict) -> [dict]:
+    return build_error_records(document, find_language_errors(checker, document[KEY_TEXT]))
+
+
+def check_documents(checker, documents, cache=None, max_pending: int = LANGUAGETOOL_MAX_PENDING_CHECKS,
+                    sentences=None):
+    """
+    Checks the text of the documents with LanguageTool, several documents per request. Requests are sent from a pool
+    of threads, one per server of the checker, while the results of the previous ones are emitted. Documents whose
+    errors are cached skip the check
+    :param checker: LanguageTool instance or pool of instances
+    :param max_pending: maximum number of requests in progress
+    :param sentences: cache of the errors of each sentence. If set, the documents are checked sentence by sentence and
+    only the sentences whose errors are not cached are sent to LanguageTool
+    :return: generator of tuples with each document and its language errors, in the same order as the received
+    documents
+    """
+    if cache is None:
+        lookups = ((document, None) for document in documents)
+    else:
+        lookups = timings.iterate(STAGE_CACHE, cache.lookup(documents, lambda document: document[KEY_TEXT]))
+
+    def submit(executor, batch):
+        texts = [document[KEY_TEXT] for document, errors in batch if errors is None]
+
+        if sentences is None:
+            return batch, executor.submit(find_language_errors_in_batch, checker, texts) if texts else None, None
+
+        plans, missing, waiting = plan_sentence_checks(sentences, texts, in_flight)
+        check = executor.submit(find_sentence_errors, checker, missing) if missing else None
+
+        # Later batches wait for this check instead of sending the same sentences again
+        for index, sentence in enumerate(missing):
+            in_flight[sentence] = check, index
+
+        return batch, check, (texts, plans, missing, waiting)
+
+    def emit(batch, found, sentence_checks):
+        with timings.stage(STAGE_LANGUAGE_CHECK):
+            found = found.result() if found is not None else []
+
+        if sentence_checks is not None:
+            found = resolve_sentence_checks(sentences, *sentence_checks, found)
+
+            # The errors of the checked sentences are cached from now on
+            _, _, missing, _ = sentence_checks
+
+            for sentence in missing:
+                in_flight.pop(sentence)
+
+        found = iter(found)
+
+        for document, errors in batch:
+            if errors is None:
+                errors = next(found)
+
+                if cache is not None:
+                    with timings.stage(STAGE_CACHE):
+                        cache.put(document[KEY_TEXT], errors)
+
+            timings.count('documents')
+            timings.count('characters', len(document[KEY_TEXT]))
+
+            yield document, errors
+
+    pending = collections.deque()
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=getattr(checker, 'size', 1)) as executor:
+        for batch in batch_lookups(lookups, LANGUAGETOOL_BATCH_CHARACTERS):
+            pending.append(submit(executor, batch))
+
+            if len(pending) >= max_pending:
+                yield from emit(*pending.popleft())
+
+        while pending:
+            yield from emit(*pending.popleft())
+
+
+def analyse_documents(checker, documents, cache=None, max_pending: int = LANGUAGETOOL_MAX_PENDING_CHECKS,
+                      sentences=None):
+    """
+    :return: generator of all the language errors of the documents, in the same order as the received documents
+    """
+    for document, errors in check_documents(checker, documents, cache, max_pending, sentences):
+        yield from build_error_records(document, errors)
+
+
+def analyse_file(bucket: str, key: str, results_bucket: str, results_key: str, summaries_key: str, checker,
+                 cache=None, shard: (int, int) = None, sentences=None):
+    # Stream the recently indexed documents, converting them to python dictionaries as they are read
+    documents = analysis_job.retrieve_documents(bucket, key, shard)
+
+    # Upload the summary of the errors of each document and, if enabled, a capped number of examples of the errors as
+    # they are found. Only upload an examples file if there are captured errors
+    with analysis_job.ResultsWriter(results_bucket, summaries_key, skip_empty=True) as summaries_writer, \
+            analysis_job.ResultsWriter(results_bucket, results_key, skip_empty=True) as errors_writer:
+        for document, errors in check_documents(checker, documents, cache, sentences=sentences):
+            summaries_writer.write(summarise_errors(document, errors))
+
+            if ERROR_EXAMPLES_PER_RULE:
+                for error in build_error_records(document, errors, ERROR_EXAMPLES_PER_RULE):
+                    errors_writer.write(error)
 
 
 if __name__ == '__main__':
-    # Get from the command line arguments the name of the source bucket and the file that was uploaded
-    indexed_data_sources_bucket = sys.argv[1]
-    key = sys.argv[2]
+    # Get from the command line arguments the name of the source bucket and the files that were uploaded
+    args = analysis_job.parse_arguments('Finds language errors in the documents of data source files')
+
+    # Retrieve from SSM the language to check
+    language = analysis_job.get_parameter(CONFIG_PARAM_LANGUAGE)
+
+    # Start the LanguageTool servers in the background while the job gets ready. The servers are started once and
+    # shared by all the files of the job
+    configure_jvm()
+    startup_executor = ThreadPoolExecutor(max_workers=1)
+    starting_checker = startup_executor.submit(start_language_tool_pool, language, LANGUAGETOOL_SERVERS)
+
+    # Retrieve from SSM the values of the rest of config parameters
+    analysis_results_bucket = analysis_job.get_parameter(CONFIG_PARAM_ANALYSIS_RESULTS_BUCKET)
+    default_profile, profile_by_source = get_profiles()
+
+    # Open the cache of language errors. Errors depend on the text, the language, the LanguageTool version and the
+    # profile of the rules checked
+    cache = analysis_cache.open_cache([ANALYSIS_FOLDER_NAME, language, LANGUAGETOOL_VERSION, default_profile])
+
+    # Open the cache of the errors of each sentence, which depend on the same values as the errors of the documents
+    sentences = sentence_cache.open_sentence_cache([ANALYSIS_FOLDER_NAME, 'sentences', language, LANGUAGETOOL_VERSION,
+                                                    default_profile])
+
+    # Wait for the servers to start
+    with timings.stage(STAGE_MODEL_LOAD):
+        checker = starting_checker.result()
+
+    startup_executor.shutdown()
+
+    def process(bucket: str, key: str):
+        timings.count('files')
+
+        # Check the rules of the profile of the source of the file, and use the cached errors of the same profile
+        profile = select_profile(key, default_profile, profile_by_source)
+        apply_profile(checker, profile)
+
+        if cache is not None:
+            cache.set_namespace([ANALYSIS_FOLDER_NAME, language, LANGUAGETOOL_VERSION, profile])
+
+        if sentences is not None:
+            sentences.set_namespace([ANALYSIS_FOLDER_NAME, 'sentences', language, LANGUAGETOOL_VERSION, profile])
+
+        if args.shard is None:
+            # Generate keys that are the same as the received one, but adding an extra folder in the last level
+            analyse_file(bucket, key, analysis_results_bucket, generate_results_key(key),
+                         generate_results_key(key, SUMMARIES_FOLDER_NAME), checker, cache, sentences=sentences)
+        else:
+            analyse_file(bucket, key, os.environ[ENV_PARTIAL_RESULTS_BUCKET],
+                         generate_partial_results_key(args.run_id, key, args.shard[0]),
+                         generate_partial_results_key(args.run_id, key, args.shard[0], SUMMARIES_FOLDER_NAME),
+                         checker, cache, args.shard, sentences)
 
-    # Retrieve from SSM the values of some config parameters
-    analysis_results_bucket = get_parameter(CONFIG_PARAM_ANALYSIS_RESULTS_BUCKET)
-    language = get_parameter(CONFIG_PARAM_LANGUAGE)
+    if args.worker:
+        # Process the files received from the queue until it has been idle for the configured time
+        print(json.dumps({'worker': work_queue.consume(work_queue.open_work_queue(args.worker), process,
+                                                       args.idle_timeout)}))
+    else:
+        for key in args.keys:
+            process(args.bucket, key)
 
-    # Load the LanguageTool model to use
-    checker = langtool.LanguageTool(language)
+    if cache is not None:
+        with timings.stage(STAGE_CACHE):
+            cache.close()
 
-    # Retrieve the recently indexed documents and convert them to python dictionaries
-    documents = retrieve_file_contents(indexed_data_sources_bucket, key).split('\n')
-    documents = list(map(json.loads, documents))
+        print(json.dumps({'cache': cache.stats()}))
 
-    # Generate a list that contains the language errors found in the text of the document
-    analysis_results = []
+    if sentences is not None:
+        with timings.stage(STAGE_CACHE):
+            sentences.close()
 
-    for document in documents:
-        analysis_results.extend(analyse_document_text(checker, document))
+        stats = sentences.stats()
+        print(json.dumps({'sentence_cache': stats}))
 
-    # Only upload a results file if there are captured errors
-    if analysis_results:
-        # Generate a key that it's the same as the received one, but adding an extra folder in the last level
-        results_key = generate_results_key(key)
+        timings.gauge('sentence_cache.hit_rate', stats['hit_rate'] * 100, 'Percent')
+        timings.gauge('sentence_cache.seconds_saved', stats['estimated_seconds_saved'], 'Seconds')
 
-        # Upload the results of the analysis
-        upload_contents(analysis_results_bucket, results_key, '\n'.join([json.dumps(document)
-                                                                         for document in analysis_results]))
+    # Time spent in each stage and throughput of the job
+    timings.emit(ANALYSIS_FOLDER_NAME)
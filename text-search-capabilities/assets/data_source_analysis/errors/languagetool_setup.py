@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: installs LanguageTool in the errors image when it is built, so jobs do not download it, and creates a class
+# data sharing (AppCDS) archive of the classes loaded by a LanguageTool server, which makes the servers start faster
+# Usage: python3 languagetool_setup.py LANGUAGE
+
+import os
+import subprocess
+import sys
+import language_tool_python as langtool
+
+from language_tool_python.download_lt import download_lt
+from language_tool_python.utils import get_jar_info
+
+
+ENV_CDS_ARCHIVE = 'LANGUAGETOOL_CDS_ARCHIVE'
+
+# Text checked to load the classes used when checking texts, besides the ones used to start the server
+SAMPLE_TEXT = 'This are a example sentence , with some errors.'
+
+
+def dump_class_list(language: str, class_list: str):
+    """
+    Starts a LanguageTool server, checks a text and writes the list of the classes loaded by the JVM
+    """
+    os.environ['JAVA_TOOL_OPTIONS'] = '-Xshare:off -XX:DumpLoadedClassList={}'.format(class_list)
+
+    try:
+        with langtool.LanguageTool(language) as checker:
+            checker.check(SAMPLE_TEXT)
+    finally:
+        del os.environ['JAVA_TOOL_OPTIONS']
+
+
+def create_archive(class_list: str, archive: str):
+    # The class path must be the same one used to start the servers, or the JVM ignores the archive
+    java_path, jar_path = get_jar_info()
+
+    subprocess.run([java_path, '-Xshare:dump', '-XX:SharedClassListFile={}'.format(class_list),
+                    '-XX:SharedArchiveFile={}'.format(archive), '-cp', jar_path], check=True)
+
+
+if __name__ == '__main__':
+    # Installed in the folder set in LTP_PATH
+    download_lt()
+
+    archive = os.environ.get(ENV_CDS_ARCHIVE)
+
+    if archive:
+        class_list = os.path.splitext(archive)[0] + '.classlist'
+
+        dump_class_list(sys.argv[1], class_list)
+        create_archive(class_list, archive)
+        os.remove(class_list)
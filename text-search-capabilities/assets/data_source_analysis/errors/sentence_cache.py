@@ -0,0 +1,158 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: memoisation of the language errors of each sentence, so sentences repeated across documents (boilerplate,
+# quotes, disclaimers, etc.) are only checked once by LanguageTool
+
+import collections
+import json
+import os
+import re
+import analysis_cache
+
+
+# Number of sentences whose errors are kept in memory. 0 disables the memoisation, which is opt-in because checking
+# sentences on their own changes the errors found: rules that look beyond a sentence do not fire, and abbreviations
+# split by SENTENCE_BOUNDARY produce fragments that can be reported as errors
+ENV_SENTENCE_CACHE_SIZE = 'SENTENCE_CACHE_SIZE'
+DEFAULT_SENTENCE_CACHE_SIZE = 0
+
+# Path of a SQLite file in which the errors of the sentences are also stored, so they outlive the job
+ENV_SENTENCE_CACHE_PATH = 'SENTENCE_CACHE_PATH'
+
+# End of a sentence: terminal punctuation, optionally followed by closing quotes or brackets, and whitespace. Line
+# breaks always end a sentence
+SENTENCE_BOUNDARY = re.compile(r'[.!?…]+[\'"’”»)\]]*\s+|\n\s*')
+
+
+def split_sentences(text: str) -> [(int, str)]:
+    """
+    Splits a text into sentences. The whitespace around the sentences is not part of them
+    :return: list of tuples with the offset of each sentence in the text and the sentence
+    """
+    sentences = []
+    start = 0
+
+    for boundary in [*SENTENCE_BOUNDARY.finditer(text), None]:
+        end = boundary.end() if boundary else len(text)
+        sentence = text[start:end].strip()
+
+        if sentence:
+            sentences.append((text.index(sentence, start), sentence))
+
+        start = end
+
+    return sentences
+
+
+class SentenceCache:
+    """
+    Least recently used errors of each sentence, optionally backed by a persistent analysis cache. Errors are stored
+    with their offsets in the sentence, so they can be placed in any text that contains it
+    """
+
+    def __init__(self, max_entries: int, namespace: [str], store=None):
+        """
+        :param max_entries: maximum number of sentences kept in memory
+        :param namespace: values the errors depend on besides the sentence
+        :param store: analysis cache in which the errors are also stored, or None
+        """
+        self.hits = 0
+        self.misses = 0
+        self.hit_characters = 0
+        self.checked_characters = 0
+        self.check_seconds = 0
+
+        self.__max_entries = max_entries
+        self.__store = store
+        self.__namespace = json.dumps(namespace)
+        self.__entries = collections.OrderedDict()
+
+    def set_namespace(self, namespace: [str]):
+        """
+        Changes the values the errors depend on besides the sentence, for the lookups and errors that come afterwards
+        """
+        self.__namespace = json.dumps(namespace)
+
+        if self.__store is not None:
+            self.__store.set_namespace(namespace)
+
+    def __remember(self, sentence: str, errors: [dict]):
+        key = (self.__namespace, sentence)
+        self.__entries[key] = errors
+        self.__entries.move_to_end(key)
+
+        if len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+
+    def get(self, sentence: str):
+        """
+        :return: the errors of the sentence, or None if they are not cached
+        """
+        errors = self.__entries.get((self.__namespace, sentence))
+
+        if errors is not None:
+            self.__entries.move_to_end((self.__namespace, sentence))
+        elif self.__store is not None:
+            errors = self.__store.get(sentence)
+
+            if errors is not None:
+                self.__remember(sentence, errors)
+
+        if errors is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.hit_characters += len(sentence)
+
+        return errors
+
+    def put(self, sentence: str, errors: [dict]):
+        self.__remember(sentence, errors)
+
+        if self.__store is not None:
+            self.__store.put(sentence, errors)
+
+    def record_check(self, characters: int, seconds: float):
+        """
+        Records the time taken to check sentences that were not cached, from which the time saved is estimated
+        """
+        self.checked_characters += characters
+        self.check_seconds += seconds
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        seconds_per_character = self.check_seconds / self.checked_characters if self.checked_characters else 0
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+            'estimated_seconds_saved': round(self.hit_characters * seconds_per_character, 3)
+        }
+
+    def close(self):
+        if self.__store is not None:
+            self.__store.close()
+
+
+def open_sentence_cache(namespace: [str]):
+    """
+    Opens the sentence cache configured through the environment variables of the job
+    :param namespace: values the errors depend on besides the sentence
+    :return: the cache, or None if it is disabled
+    """
+    max_entries = int(os.environ.get(ENV_SENTENCE_CACHE_SIZE, DEFAULT_SENTENCE_CACHE_SIZE))
+
+    if not max_entries:
+        return None
+
+    path = os.environ.get(ENV_SENTENCE_CACHE_PATH)
+    store = None
+
+    if path:
+        max_size = int(os.environ.get(analysis_cache.ENV_CACHE_MAX_SIZE_MB,
+                                      analysis_cache.DEFAULT_CACHE_MAX_SIZE_MB)) * 1024 * 1024
+        store = analysis_cache.AnalysisCache(analysis_cache.SQLiteCacheBackend(path, max_size), namespace)
+
+    return SentenceCache(max_entries, namespace, store)
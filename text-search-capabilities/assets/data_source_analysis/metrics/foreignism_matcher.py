@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: Aho-Corasick automaton that finds all the foreignisms contained in a text in a single scan
+
+
+class ForeignismMatcher:
+    """
+    Multi-pattern matcher built once from the list of foreignisms. Occurrences of each foreignism are counted the same
+    way str.count does it: from left to right and without overlapping occurrences of the same foreignism. Occurrences
+    of different foreignisms may overlap (e.g. ' prime time ' inside ' access prime time ').
+    """
+
+    def __init__(self, foreignisms: [str]):
+        self.__foreignisms = foreignisms
+
+        # Duplicated entries share a pattern, and each of them is reported as in the original list
+        pattern_ids = {}
+        self.__positions = []
+
+        for position, word in enumerate(foreignisms):
+            if word not in pattern_ids:
+                pattern_ids[word] = len(pattern_ids)
+                self.__positions.append([])
+
+            self.__positions[pattern_ids[word]].append(position)
+
+        self.__build_automaton(pattern_ids)
+
+    def __build_automaton(self, pattern_ids: dict):
+        # Trie of the patterns. Node 0 is the root
+        self.__goto = [{}]
+        self.__output = [()]
+
+        for word, pattern_id in pattern_ids.items():
+            node = 0
+
+            for char in word:
+                next_node = self.__goto[node].get(char)
+
+                if next_node is None:
+                    next_node = len(self.__goto)
+                    self.__goto[node][char] = next_node
+                    self.__goto.append({})
+                    self.__output.append(())
+
+                node = next_node
+
+            self.__output[node] += ((pattern_id, len(word)),)
+
+        # Failure links, calculated with a breadth-first traversal of the trie
+        self.__fail = [0] * len(self.__goto)
+        queue = list(self.__goto[0].values())
+
+        for node in queue:
+            for char, next_node in self.__goto[node].items():
+                fail = self.__fail[node]
+
+                while fail and char not in self.__goto[fail]:
+                    fail = self.__fail[fail]
+
+                fail = self.__goto[fail].get(char, 0)
+                self.__fail[next_node] = fail
+                self.__output[next_node] += self.__output[fail]
+                queue.append(next_node)
+
+    def __len__(self):
+        return len(self.__foreignisms)
+
+    def count(self, text: str) -> dict:
+        """
+        Scans the text once and counts the occurrences of each of the patterns
+        :return: dictionary with the identifier of the patterns found and their number of occurrences
+        """
+        goto = self.__goto
+        fail = self.__fail
+        output = self.__output
+
+        counts = {}
+        next_allowed_start = {}
+        node = 0
+
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+
+            node = goto[node].get(char, 0)
+
+            for pattern_id, length in output[node]:
+                # Skip occurrences that overlap with the previous occurrence of the same pattern
+                if end - length >= next_allowed_start.get(pattern_id, 0):
+                    counts[pattern_id] = counts.get(pattern_id, 0) + 1
+                    next_allowed_start[pattern_id] = end
+
+        return counts
+
+    def find(self, text: str) -> [str]:
+        """
+        Finds the foreignisms contained in a text
+        :return: list with one entry per occurrence, in the same order as the list of foreignisms
+        """
+        found = []
+
+        for pattern_id, count in self.count(text).items():
+            for position in self.__positions[pattern_id]:
+                found.append((position, count))
+
+        found.sort()
+
+        return [self.__foreignisms[position].strip() for position, count in found for _ in range(count)]
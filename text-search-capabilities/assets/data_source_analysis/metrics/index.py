@@ -3,15 +3,18 @@
 # License: Apache 2.0
 # Summary: script that calculates various metrics of the language used in the documents being processed
 
-import sys
-import boto3
 import spacy
 import json
 import string
 import warnings
 import os
+import collections
 
 from lexical_diversity import lex_div as ld
+from foreignism_matcher import ForeignismMatcher
+import analysis_cache
+import analysis_job
+import work_queue
 
 spacy_models = {
     'ca': {
@@ -94,8 +97,6 @@ spacy_models = {
 
 warnings.simplefilter(action='ignore')
 
-REGION = os.environ['AWS_REGION']
-
 ANALYSIS_FOLDER_NAME = 'metrics'
 KEY_ID = 'id'
 KEY_TEXT = 'text'
@@ -107,26 +108,95 @@ CONFIG_PARAM_CONFIG_FILES_BUCKET = '/{}/configFilesBucket'.format(SSM_PARAMS_PAT
 CONFIG_PARAM_SPACY_MODE = '/{}/spaCyMode'.format(SSM_PARAMS_PATH)
 CONFIG_PARAM_LANGUAGE = '/{}/language'.format(SSM_PARAMS_PATH)
 
+# When the job runs as a child of an AWS Batch array job, each child analyses one shard of the files and uploads its
+# results to the partial results bucket, from which they are merged once all the children finish
+ENV_PARTIAL_RESULTS_BUCKET = 'PARTIAL_RESULTS_BUCKET'
+
+# Stages of the job whose time is measured, besides the ones measured by analysis_job (SSM, S3 download, JSON parse,
+# serialisation and upload)
+STAGE_MODEL_LOAD = 'model_load'
+STAGE_NLP = 'nlp'
+STAGE_DOCUMENT_METRICS = 'document_metrics'
+STAGE_FOREIGNISM_SCAN = 'foreignism_scan'
+STAGE_CACHE = 'cache'
+
+timings = analysis_job.timings
+
+# CPU quota of the container, in cgroup v2 and v1 hierarchies
+CGROUP_V2_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+CGROUP_V1_CPU_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+CGROUP_V1_CPU_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+
+# Worker processes used by default to parse the documents. Each process loads its own copy of the model, so the
+# memory of the job limits them before its vCPUs do
+SPACY_MAX_N_PROCESS = 4
+
+
+def cgroup_cpu_quota():
+    """
+    :return: number of CPUs the cgroup of the container is allowed to use, or None if it has no quota
+    """
+    try:
+        with open(CGROUP_V2_CPU_MAX) as file:
+            quota, period = file.read().split()
+
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open(CGROUP_V1_CPU_QUOTA) as quota_file, open(CGROUP_V1_CPU_PERIOD) as period_file:
+            quota, period = int(quota_file.read()), int(period_file.read())
+
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
 
-def retrieve_file_contents(bucket: str, key: str) -> str:
-    client = boto3.client('s3', region_name=REGION)
-    response = client.get_object(Bucket=bucket, Key=key)
-    return response['Body'].read().decode('utf-8')
+def available_cpus() -> int:
+    """
+    :return: number of CPUs the job can use. os.cpu_count returns the CPUs of the host, which in a container can be
+    many more than the ones the job was given
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = cgroup_cpu_quota()
+
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+
+    return cpus
+
+
+# Number of documents buffered by spaCy per batch and number of worker processes used to parse them
+SPACY_BATCH_SIZE = int(os.environ.get('SPACY_BATCH_SIZE', 64))
+SPACY_N_PROCESS = int(os.environ.get('SPACY_N_PROCESS', min(available_cpus(), SPACY_MAX_N_PROCESS)))
+
+# Pipeline components that produce the token attributes read by the analysis (pos_, lemma_ and lower_). tok2vec and
+# transformer need to be kept because the tagger, morphologizer and lemmatizer listen to their output
+SPACY_REQUIRED_COMPONENTS = ['tok2vec', 'transformer', 'tagger', 'morphologizer', 'attribute_ruler', 'lemmatizer',
+                             'trainable_lemmatizer']
 
 
 def retrieve_foreignisms() -> [str]:
-    foreignisms = retrieve_file_contents(system_config_bucket, FOREIGNISMS_FILE_NAME).split('\n')
+    foreignisms = analysis_job.retrieve_file_contents(system_config_bucket, FOREIGNISMS_FILE_NAME).split('\n')
     return [' {} '.format(word.strip()) for word in foreignisms]
 
 
-def upload_contents(bucket: str, key: str, contents: str):
-    client = boto3.client('s3', region_name=REGION)
+def load_spacy_model(name: str):
+    """
+    Loads a spaCy model excluding the components of its pipeline that the analysis does not need
+    :param name: name of the installed spaCy model
+    :return: the loaded model and the list of excluded components
+    """
+    meta = spacy.util.get_model_meta(spacy.util.get_package_path(name))
+    components = meta.get('components', meta.get('pipeline', []))
+    excluded = [component for component in components if component not in SPACY_REQUIRED_COMPONENTS]
 
-    return client.put_object(
-        Body=contents.encode('ascii'),
-        Bucket=bucket,
-        Key=key
-    )
+    return spacy.load(name, exclude=excluded), excluded
 
 
 def build_translation_table():
@@ -149,56 +219,60 @@ def build_translation_table():
     return str.maketrans(table)
 
 
-def find_foreignisms_in_text(text, translation_table, foreignisms):
+def find_foreignisms_in_text(text, translation_table, foreignisms_matcher: ForeignismMatcher):
     # Adding blank spaces to allow for recognition of foreignisms in first and last position
     processed_text = ' {} '.format(text.lower().translate(translation_table))
-    found_foreignisms = []
 
-    # Count how many times foreign words appear in text
-    for word in foreignisms:
-        if word in processed_text:
-            found_foreignisms.extend([word.strip() for _ in range(processed_text.count(word))])
+    # Find how many times foreign words appear in text
+    with timings.stage(STAGE_FOREIGNISM_SCAN):
+        return foreignisms_matcher.find(processed_text)
 
-    return found_foreignisms
 
+def analyse_document_text(tokens, foreignisms_matcher, translation_table) -> dict:
+    text = tokens.text
 
-def analyse_document_text(nlp, foreignisms, translation_table, text: str) -> dict:
-    tokens = nlp(text)
+    # Part of speech analysis. All the token attributes are gathered in a single pass over the document
+    lower_tokens = []
+    lemm_adjectives = []
+    lemm_nouns = []
+    lemm_verbs = []
+    adverbs = []
 
-    # Part of speech analysis
-    adjectives = [x.lower_ for x in tokens if x.pos_ == 'ADJ']
-    lemm_adjectives = [x.lemma_.lower() for x in tokens if x.pos_ == 'ADJ']
-    unique_lemm_adjectives = len(set(lemm_adjectives))
+    for token in tokens:
+        lower = token.lower_
+        lower_tokens.append(lower)
+        pos = token.pos_
 
-    nouns = [x.lower_ for x in tokens if x.pos_ == 'NOUN']
-    lemm_nouns = [x.lemma_.lower() for x in tokens if x.pos_ == 'NOUN']
-    unique_lemm_nouns = len(set(lemm_nouns))
+        if pos == 'ADJ':
+            lemm_adjectives.append(token.lemma_.lower())
+        elif pos == 'NOUN':
+            lemm_nouns.append(token.lemma_.lower())
+        elif pos == 'VERB':
+            lemm_verbs.append(token.lemma_.lower())
+        elif pos == 'ADV':
+            adverbs.append(lower)
 
-    verbs = [x.lower_ for x in tokens if x.pos_ == 'VERB']
-    lemm_verbs = [x.lemma_.lower() for x in tokens if x.pos_ == 'VERB']
+    unique_lemm_adjectives = len(set(lemm_adjectives))
+    unique_lemm_nouns = len(set(lemm_nouns))
     unique_lemm_verbs = len(set(lemm_verbs))
 
-    adverbs = [x.lower_ for x in tokens if x.pos_ == 'ADV']
-
     # General metrics
-    tokens = [x.lower_ for x in tokens]
-
-    ttr = ld.ttr(tokens)
-    mtld = ld.mtld(tokens)
-    n_tokens = len(tokens)
+    ttr = ld.ttr(lower_tokens)
+    mtld = ld.mtld(lower_tokens)
+    n_tokens = len(lower_tokens)
 
     # Part of speech percentage analysis
 
     # Adjectives
-    adj_pct = round(len(adjectives) / n_tokens * 100, 2)
+    adj_pct = round(len(lemm_adjectives) / n_tokens * 100, 2)
     unique_lemm_adj_pct = round(unique_lemm_adjectives / n_tokens * 100, 2)
 
     # Nouns
-    nouns_pct = round(len(nouns) / n_tokens * 100, 2)
+    nouns_pct = round(len(lemm_nouns) / n_tokens * 100, 2)
     unique_lemm_nouns_pct = round(unique_lemm_nouns / n_tokens * 100, 2)
 
     # Verbs
-    verbs_pct = round(len(verbs) / n_tokens * 100, 2)
+    verbs_pct = round(len(lemm_verbs) / n_tokens * 100, 2)
     unique_lemm_verbs_pct = round(unique_lemm_verbs / n_tokens * 100, 2)
 
     # Adverbs
@@ -206,8 +280,8 @@ def analyse_document_text(nlp, foreignisms, translation_table, text: str) -> dic
     unique_adverbs_pct = round(len(set(adverbs)) / n_tokens * 100, 2)
 
     # Foreignisms
-    if foreignisms:
-        fw_list = find_foreignisms_in_text(text, translation_table, foreignisms)
+    if foreignisms_matcher:
+        fw_list = find_foreignisms_in_text(text, translation_table, foreignisms_matcher)
         fw_pct = round(len(fw_list) / n_tokens * 100, 2)
     else:
         fw_list = []
@@ -234,52 +308,138 @@ def analyse_document_text(nlp, foreignisms, translation_table, text: str) -> dic
     }
 
 
+def analyse_documents(nlp, foreignisms_matcher, translation_table, documents, batch_size: int, n_process: int,
+                      cache=None):
+    """
+    Parses the text of the documents with spaCy in batches, spreading the work across several processes. Documents
+    whose results are cached skip the analysis
+    :return: generator of analysis results, in the same order as the received documents
+    """
+    if cache is None:
+        lookups = ((document, None) for document in documents)
+    else:
+        lookups = timings.iterate(STAGE_CACHE, cache.lookup(documents, lambda document: document[KEY_TEXT]))
+
+    # Documents whose text has been handed to spaCy, together with their cached results. Only the documents that are
+    # not cached are parsed, so the ones in between are emitted when the next parsed document comes out of the pipe
+    pending = collections.deque()
+
+    def texts_to_parse():
+        for document, results in lookups:
+            pending.append((document, results))
+
+            if results is None:
+                yield document[KEY_TEXT]
+
+    def build_results(document: dict, results: dict) -> dict:
+        timings.count('documents')
+        timings.count('tokens', results['tokens'])
+        return {**{KEY_ID: document[KEY_ID]}, **results}
+
+    parsed = nlp.pipe(texts_to_parse(), batch_size=batch_size, n_process=n_process)
+
+    for tokens in timings.iterate(STAGE_NLP, parsed):
+        document, results = pending.popleft()
+
+        while results is not None:
+            yield build_results(document, results)
+            document, results = pending.popleft()
+
+        with timings.stage(STAGE_DOCUMENT_METRICS):
+            results = analyse_document_text(tokens, foreignisms_matcher, translation_table)
+
+        if cache is not None:
+            with timings.stage(STAGE_CACHE):
+                cache.put(document[KEY_TEXT], results)
+
+        yield build_results(document, results)
+
+    # The documents after the last parsed one are all cached
+    while pending:
+        document, results = pending.popleft()
+        yield build_results(document, results)
+
+
 def generate_results_key(key: str) -> str:
     components = key.split('/')
     components.insert(-1, ANALYSIS_FOLDER_NAME)
     return '/'.join(components)
 
 
-def get_parameter(name: str):
-    client = boto3.client('ssm', region_name=REGION)
-    return client.get_parameter(Name=name)['Parameter']['Value']
+def generate_partial_results_key(run_id: str, key: str, index: int) -> str:
+    # Shards are merged in the order of their keys
+    return '{}/{}/{}/{:05d}'.format(run_id, ANALYSIS_FOLDER_NAME, key, index)
+
+
+def analyse_file(bucket: str, key: str, results_bucket: str, results_key: str, nlp, foreignisms_matcher,
+                 translation_table, cache=None, shard: (int, int) = None):
+    # Stream the recently indexed documents, converting them to python dictionaries as they are read
+    documents = analysis_job.retrieve_documents(bucket, key, shard)
+
+    # Upload the identifier of each document and the calculated data points as they are calculated. Shards without
+    # documents are not uploaded, as the merged results are the same
+    with analysis_job.ResultsWriter(results_bucket, results_key, skip_empty=shard is not None) as writer:
+        for result in analyse_documents(nlp, foreignisms_matcher, translation_table, documents,
+                                        SPACY_BATCH_SIZE, SPACY_N_PROCESS, cache):
+            writer.write(result)
 
 
 if __name__ == '__main__':
-    # Get from the command line arguments the name of the source bucket and the file that was uploaded
-    indexed_data_sources_bucket = sys.argv[1]
-    key = sys.argv[2]
+    # Get from the command line arguments the name of the source bucket and the files that were uploaded
+    args = analysis_job.parse_arguments('Calculates language metrics of the documents of data source files')
 
     # Retrieve from SSM the values of some config parameters
-    analysis_results_bucket = get_parameter(CONFIG_PARAM_ANALYSIS_RESULTS_BUCKET)
-    system_config_bucket = get_parameter(CONFIG_PARAM_CONFIG_FILES_BUCKET)
-    mode = get_parameter(CONFIG_PARAM_SPACY_MODE)
-    language = get_parameter(CONFIG_PARAM_LANGUAGE)
+    analysis_results_bucket = analysis_job.get_parameter(CONFIG_PARAM_ANALYSIS_RESULTS_BUCKET)
+    system_config_bucket = analysis_job.get_parameter(CONFIG_PARAM_CONFIG_FILES_BUCKET)
+    mode = analysis_job.get_parameter(CONFIG_PARAM_SPACY_MODE)
+    language = analysis_job.get_parameter(CONFIG_PARAM_LANGUAGE)
 
-    # Determine the SpaCy model to use based on the chosen language and analysis mode
-    nlp = spacy.load(spacy_models[language][mode])
+    # Determine the SpaCy model to use based on the chosen language and analysis mode. The model is loaded once and
+    # shared by all the files of the job
+    with timings.stage(STAGE_MODEL_LOAD):
+        nlp, excluded_components = load_spacy_model(spacy_models[language][mode])
 
-    # Retrieve the recently indexed documents and convert them to python dictionaries
-    documents = retrieve_file_contents(indexed_data_sources_bucket, key).split('\n')
-    documents = list(map(json.loads, documents))
+    print('Excluded spaCy pipeline components: {}'.format(', '.join(excluded_components) or 'none'))
 
-    # Retrieve the list of foreignisms to detect
+    # Retrieve the list of foreignisms to detect and build the automaton that finds them
     foreignisms = retrieve_foreignisms()
 
+    with timings.stage(STAGE_MODEL_LOAD):
+        foreignisms_matcher = ForeignismMatcher(foreignisms)
+
+    # Open the cache of analysis results. Results depend on the text, the model and the list of foreignisms. Texts are
+    # not normalised, since the results contain lemmas and foreignisms copied from the text
+    cache = analysis_cache.open_cache([ANALYSIS_FOLDER_NAME, language, nlp.meta['name'], nlp.meta['version'],
+                                       spacy.__version__, analysis_cache.digest(foreignisms)])
+
     # Build a translation table to remove punctuation
     translation_table = build_translation_table()
 
-    # Generate a list that contains the identifier of the document and the calculated data points
-    analysis_results = [
-        {
-            **{KEY_ID: document[KEY_ID]},
-            **analyse_document_text(nlp, foreignisms, translation_table, document[KEY_TEXT])
-        } for document in documents
-    ]
+    def process(bucket: str, key: str):
+        timings.count('files')
+
+        if args.shard is None:
+            # Generate a key that it's the same as the received one, but adding an extra folder in the last level
+            analyse_file(bucket, key, analysis_results_bucket, generate_results_key(key), nlp, foreignisms_matcher,
+                         translation_table, cache)
+        else:
+            analyse_file(bucket, key, os.environ[ENV_PARTIAL_RESULTS_BUCKET],
+                         generate_partial_results_key(args.run_id, key, args.shard[0]), nlp, foreignisms_matcher,
+                         translation_table, cache, args.shard)
+
+    if args.worker:
+        # Process the files received from the queue until it has been idle for the configured time
+        print(json.dumps({'worker': work_queue.consume(work_queue.open_work_queue(args.worker), process,
+                                                       args.idle_timeout)}))
+    else:
+        for key in args.keys:
+            process(args.bucket, key)
+
+    if cache is not None:
+        with timings.stage(STAGE_CACHE):
+            cache.close()
 
-    # Generate a key that it's the same as the received one, but adding an extra folder in the last level
-    results_key = generate_results_key(key)
+        print(json.dumps({'cache': cache.stats()}))
 
-    # Upload the results of the analysis
-    upload_contents(analysis_results_bucket, results_key, '\n'.join([json.dumps(document)
-                                                                     for document in analysis_results]))
+    # Time spent in each stage and throughput of the job
+    timings.emit(ANALYSIS_FOLDER_NAME)
@@ -0,0 +1,237 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: persistent cache of analysis results shared by the executions of the analysis jobs. Results are addressed by
+# a hash of the analysed text and of everything the analysis depends on (language, model, versions, etc.)
+
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import boto3
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
+# Location of the cache: s3://<bucket>/<prefix> or the path of a SQLite file. The cache is disabled if it is not set
+ENV_CACHE_LOCATION = 'ANALYSIS_CACHE'
+# Maximum size of the SQLite cache. Entries of the S3 cache expire with the lifecycle rules of its bucket instead
+ENV_CACHE_MAX_SIZE_MB = 'ANALYSIS_CACHE_MAX_SIZE_MB'
+DEFAULT_CACHE_MAX_SIZE_MB = 1024
+
+
+class SQLiteCacheBackend:
+    """
+    Stores the entries in a local SQLite file. Least recently used entries are evicted first
+    """
+    concurrency = 1
+
+    def __init__(self, path: str, max_size: int):
+        self.__max_size = max_size
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                                  'size INTEGER NOT NULL, accessed REAL NOT NULL)')
+        self.__connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    def get(self, key: str):
+        row = self.__connection.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        self.__connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, value: bytes):
+        self.__connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                                  (key, value, len(value), time.time()))
+
+    def evict(self):
+        size = self.__connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+        if size <= self.__max_size:
+            return
+
+        evicted = []
+
+        for key, entry_size in self.__connection.execute('SELECT key, size FROM entries ORDER BY accessed'):
+            if size <= self.__max_size:
+                break
+
+            evicted.append((key,))
+            size -= entry_size
+
+        self.__connection.executemany('DELETE FROM entries WHERE key = ?', evicted)
+
+    def close(self):
+        self.__connection.commit()
+        self.__connection.close()
+
+
+class S3CacheBackend:
+    """
+    Stores each entry as an object under a prefix of an S3 bucket. Entries are expired by the lifecycle rules of the
+    bucket, so the job never lists the objects of the cache
+    """
+    concurrency = 16
+
+    def __init__(self, bucket: str, prefix: str):
+        self.__bucket = bucket
+        self.__prefix = prefix
+        self.__client = boto3.client('s3', region_name=os.environ.get('AWS_REGION'))
+
+    def get(self, key: str):
+        try:
+            response = self.__client.get_object(Bucket=self.__bucket, Key=self.__prefix + key)
+        except self.__client.exceptions.NoSuchKey:
+            return None
+
+        return response['Body'].read()
+
+    def put(self, key: str, value: bytes):
+        self.__client.put_object(Bucket=self.__bucket, Key=self.__prefix + key, Body=value)
+
+    def evict(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AnalysisCache:
+    """
+    Cache of the results of analysing texts. Keys are derived from the text and a namespace that identifies everything
+    else the results depend on, so changing any of them (e.g. upgrading the model) never returns stale results
+    """
+
+    def __init__(self, backend, namespace: [str], lookahead: int = 64):
+        """
+        :param backend: object that stores the serialised results
+        :param namespace: values the results depend on besides the text
+        :param lookahead: maximum number of lookups in progress when the backend allows concurrent requests
+        """
+        self.hits = 0
+        self.misses = 0
+
+        self.__backend = backend
+        self.__namespace = json.dumps(namespace)
+        self.__lookahead = lookahead
+        self.__executor = ThreadPoolExecutor(max_workers=backend.concurrency) if backend.concurrency > 1 else None
+        self.__pending_puts = collections.deque()
+
+    def set_namespace(self, namespace: [str]):
+        """
+        Changes the values the results depend on besides the text, for the lookups and results that come afterwards
+        """
+        self.__namespace = json.dumps(namespace)
+
+    def __key(self, text: str) -> str:
+        return hashlib.sha256('{}\n{}'.format(self.__namespace, text).encode('utf-8')).hexdigest()
+
+    def __count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            value = json.loads(value)
+
+        return value
+
+    def get(self, text: str):
+        """
+        :return: the cached results of analysing the text, or None if they are not cached
+        """
+        return self.__count(self.__backend.get(self.__key(text)))
+
+    def lookup(self, items, get_text):
+        """
+        Looks up the results of a sequence of items, running several lookups at the same time if the backend allows it
+        :param items: iterable of items to look up
+        :param get_text: function that returns the text of an item
+        :return: generator of tuples with each item and its cached results (None if not cached), in the same order
+        """
+        if self.__executor is None:
+            for item in items:
+                yield item, self.get(get_text(item))
+            return
+
+        pending = collections.deque()
+
+        for item in items:
+            pending.append((item, self.__executor.submit(self.__backend.get, self.__key(get_text(item)))))
+
+            if len(pending) >= self.__lookahead:
+                item, value = pending.popleft()
+                yield item, self.__count(value.result())
+
+        while pending:
+            item, value = pending.popleft()
+            yield item, self.__count(value.result())
+
+    def put(self, text: str, value):
+        key = self.__key(text)
+        value = json.dumps(value).encode('utf-8')
+
+        if self.__executor is None:
+            self.__backend.put(key, value)
+            return
+
+        # Bound the number of results waiting to be stored
+        while len(self.__pending_puts) >= self.__lookahead:
+            self.__pending_puts.popleft().result()
+
+        self.__pending_puts.append(self.__executor.submit(self.__backend.put, key, value))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+        }
+
+    def close(self):
+        """
+        Waits for the pending results to be stored and evicts entries if the cache exceeds its maximum size
+        """
+        while self.__pending_puts:
+            self.__pending_puts.popleft().result()
+
+        if self.__executor is not None:
+            self.__executor.shutdown()
+
+        self.__backend.evict()
+        self.__backend.close()
+
+
+def digest(values: [str]) -> str:
+    """
+    Hash of a list of values (e.g. the list of foreignisms), used to tell versions of them apart in the namespace
+    """
+    return hashlib.sha256('\n'.join(values).encode('utf-8')).hexdigest()
+
+
+def open_cache(namespace: [str]):
+    """
+    Opens the cache configured through the environment variables of the job
+    :param namespace: values the cached results depend on besides the text
+    :return: the cache, or None if it is disabled
+    """
+    location = os.environ.get(ENV_CACHE_LOCATION)
+
+    if not location:
+        return None
+
+    url = urlparse(location)
+
+    if url.scheme == 's3':
+        backend = S3CacheBackend(url.netloc, url.path.lstrip('/'))
+    else:
+        max_size = int(os.environ.get(ENV_CACHE_MAX_SIZE_MB, DEFAULT_CACHE_MAX_SIZE_MB)) * 1024 * 1024
+        backend = SQLiteCacheBackend(url.path if url.scheme == 'sqlite' else location, max_size)
+
+    return AnalysisCache(backend, namespace)
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: helpers shared by the metrics and errors jobs to read their arguments and configuration parameters, stream
+# the documents of the data source files and upload their results, measuring the time spent in each stage
+
+import argparse
+import contextlib
+import json
+import os
+import work_queue
+import instrumentation
+
+from language_analysis.utils import system_config, s3
+
+
+# The job definitions set AWS_REGION, which boto3 does not read
+if 'AWS_REGION' in os.environ:
+    os.environ.setdefault('AWS_DEFAULT_REGION', os.environ['AWS_REGION'])
+
+# When the job runs as a child of an AWS Batch array job, each child analyses one shard of the files
+ENV_ARRAY_INDEX = 'AWS_BATCH_JOB_ARRAY_INDEX'
+ENV_SHARDS = 'ANALYSIS_SHARDS'
+
+# Stages of the jobs measured by the helpers
+STAGE_SSM = 'ssm'
+STAGE_S3_DOWNLOAD = 's3_download'
+STAGE_JSON_PARSE = 'json_parse'
+STAGE_SERIALISATION = 'serialisation'
+STAGE_UPLOAD = 'upload'
+
+timings = instrumentation.StageTimer()
+
+
+class ResultsWriter(s3.MultipartUploadWriter):
+    """
+    Uploads the results of a job as they are produced, counting the time spent serialising and uploading them in their
+    stages
+    """
+
+    def write(self, document: dict):
+        with timings.stage(STAGE_SERIALISATION):
+            line = json.dumps(document).encode('ascii')
+
+        with timings.stage(STAGE_UPLOAD):
+            self.write_line(line)
+
+    def close(self):
+        with timings.stage(STAGE_UPLOAD):
+            super().close()
+
+
+def get_shard():
+    """
+    :return: tuple with the index of the shard to analyse and the number of shards when the job is a child of an
+    array job, or None otherwise
+    """
+    if ENV_ARRAY_INDEX not in os.environ:
+        return None
+
+    return int(os.environ[ENV_ARRAY_INDEX]), int(os.environ.get(ENV_SHARDS, 1))
+
+
+def parse_arguments(description: str, arguments: [str] = None) -> argparse.Namespace:
+    """
+    Parses the command line arguments. The files to analyse are received as separate keys, or as a JSON list of keys
+    (manifest) when several files are grouped in the same job. In worker mode, the files are received from a queue
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('bucket', nargs='?', help='bucket that contains the files to analyse')
+    parser.add_argument('keys', nargs='*', help='keys of the files to analyse')
+    parser.add_argument('--manifest', help='JSON list with the keys of the files to analyse')
+    parser.add_argument('--run-id', help='identifier of the analysis, under which the results of the shards are stored')
+    parser.add_argument('--worker', metavar='QUEUE',
+                        help='URL of the SQS queue (or path of the folder of messages) to receive the files from')
+    parser.add_argument('--idle-timeout', type=float,
+                        default=float(os.environ.get(work_queue.ENV_WORKER_IDLE_TIMEOUT,
+                                                     work_queue.DEFAULT_WORKER_IDLE_TIMEOUT)),
+                        help='seconds without receiving files after which the worker stops')
+
+    args = parser.parse_args(arguments)
+    args.shard = get_shard()
+
+    if args.shard is not None and not args.run_id:
+        parser.error('the run identifier is required to analyse a shard of the files')
+
+    if args.worker:
+        if args.bucket or args.manifest:
+            parser.error('files cannot be received from the command line in worker mode')
+
+        if args.shard is not None:
+            parser.error('workers cannot analyse shards of the files')
+
+        return args
+
+    if args.manifest:
+        args.keys += json.loads(args.manifest)
+
+    if not args.bucket or not args.keys:
+        parser.error('no files to analyse')
+
+    return args
+
+
+def get_parameter(name: str):
+    """
+    Retrieves the value of a parameter. All the parameters of the system are retrieved from SSM with the first one, and
+    cached for CONFIG_TTL_SECONDS seconds
+    """
+    with timings.stage(STAGE_SSM):
+        return system_config.get_parameter(name)
+
+
+def retrieve_file_contents(bucket: str, key: str) -> str:
+    with timings.stage(STAGE_S3_DOWNLOAD):
+        return s3.retrieve_file_contents(bucket, key)
+
+
+def retrieve_documents(bucket: str, key: str, shard: (int, int) = None):
+    """
+    Streams a JSON lines file from S3, so documents can be analysed while the rest of the file is downloaded
+    :param shard: tuple with the index of the shard to read and the number of shards, or None to read the whole file
+    :return: generator of documents. Blank lines are skipped
+    """
+    if shard is None:
+        lines = s3.retrieve_file_lines(bucket, key)
+    else:
+        lines = s3.retrieve_shard_lines(bucket, key, *shard)
+
+    with contextlib.closing(lines):
+        for line in timings.iterate(STAGE_S3_DOWNLOAD, lines):
+            if line.strip():
+                with timings.stage(STAGE_JSON_PARSE):
+                    document = json.loads(line)
+
+                yield document
@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: wall-clock and CPU time spent by the analysis jobs in each of their stages, emitted at the end of the jobs
+# as CloudWatch Embedded Metric Format (EMF) log lines
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+ENV_IMAGE_VERSION = 'IMAGE_VERSION'
+METRICS_NAMESPACE = 'LanguageAnalysis'
+
+
+class StageTimer:
+    """
+    Accumulates the time spent in each stage. Stages can be nested, in which case the time of the inner stage is not
+    counted in the outer one, so the times of all the stages add up to the time of the job. CPU time is the one of the
+    calling thread (the work done by background threads and processes is not included). Only the stages entered from
+    the thread that created the timer are measured, the ones entered from other threads are ignored
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.__totals = {}
+        self.__stack = []
+        self.__start = time.perf_counter()
+        self.__thread = threading.get_ident()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if threading.get_ident() != self.__thread:
+            yield
+            return
+
+        # Time of the stage and time spent in nested stages
+        frame = [time.perf_counter(), time.thread_time(), 0, 0]
+        self.__stack.append(frame)
+
+        try:
+            yield
+        finally:
+            self.__stack.pop()
+
+            wall = time.perf_counter() - frame[0]
+            cpu = time.thread_time() - frame[1]
+
+            total = self.__totals.setdefault(name, [0, 0])
+            total[0] += wall - frame[2]
+            total[1] += cpu - frame[3]
+
+            if self.__stack:
+                self.__stack[-1][2] += wall
+                self.__stack[-1][3] += cpu
+
+    def iterate(self, name: str, iterable):
+        """
+        Wraps an iterable so that the time taken to produce each of its items is counted in a stage
+        """
+        iterator = iter(iterable)
+
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+
+            yield item
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float, unit: str = 'None'):
+        """
+        Sets the value of a metric that is emitted as it is, without a rate
+        :param unit: CloudWatch unit of the value
+        """
+        self.gauges[name] = (value, unit)
+
+    def totals(self) -> dict:
+        """
+        :return: dictionary with the wall-clock and CPU seconds of each stage
+        """
+        return {name: {'wall': wall, 'cpu': cpu} for name, (wall, cpu) in self.__totals.items()}
+
+    def to_emf(self, job: str) -> dict:
+        """
+        Builds a CloudWatch Embedded Metric Format document with the time of each stage, the counters, the rate of each
+        counter per second of job and the gauges, with the job and the version of its image as dimensions
+        """
+        elapsed = time.perf_counter() - self.__start
+        values = {'elapsed.wall': (elapsed, 'Seconds')}
+
+        for name, total in self.totals().items():
+            values[name + '.wall'] = (total['wall'], 'Seconds')
+            values[name + '.cpu'] = (total['cpu'], 'Seconds')
+
+        for name, value in self.counters.items():
+            values[name] = (value, 'Count')
+            values[name + '_per_sec'] = (value / elapsed if elapsed else 0, 'Count/Second')
+
+        values.update(self.gauges)
+
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Job', 'ImageVersion']],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in values.items()]
+                }]
+            },
+            'Job': job,
+            'ImageVersion': os.environ.get(ENV_IMAGE_VERSION, 'unknown'),
+            **{name: round(value, 6) for name, (value, _) in values.items()}
+        }
+
+    def emit(self, job: str):
+        print(json.dumps(self.to_emf(job)))
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: queues of files to analyse consumed by the analysis jobs when they run as long-lived workers. Amazon SQS is
+# used in production, and a folder of message files or an in-memory queue can be used to run the workers locally
+
+import collections
+import json
+import os
+import time
+import uuid
+import boto3
+
+from urllib.parse import urlparse
+
+
+ENV_WORKER_IDLE_TIMEOUT = 'WORKER_IDLE_TIMEOUT_SECONDS'
+DEFAULT_WORKER_IDLE_TIMEOUT = 300
+
+ENV_VISIBILITY_TIMEOUT = 'WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS'
+DEFAULT_VISIBILITY_TIMEOUT = 3600
+
+# Maximum time that SQS waits for messages to arrive before returning an empty response
+SQS_MAX_WAIT_TIME = 20
+
+
+class Message:
+    def __init__(self, body: str, receipt):
+        self.body = body
+        self.receipt = receipt
+
+
+class SQSWorkQueue:
+    """
+    Amazon SQS queue. Messages that are not acknowledged become visible again after the visibility timeout, so they are
+    retried by any of the workers (or moved to the dead-letter queue of the queue, if it has one)
+    """
+
+    def __init__(self, url: str, visibility_timeout: int):
+        self.__url = url
+        self.__visibility_timeout = visibility_timeout
+        self.__client = boto3.client('sqs', region_name=os.environ.get('AWS_REGION'))
+
+    def receive(self, wait_time: float) -> [Message]:
+        response = self.__client.receive_message(QueueUrl=self.__url,
+                                                 MaxNumberOfMessages=1,
+                                                 VisibilityTimeout=self.__visibility_timeout,
+                                                 WaitTimeSeconds=int(min(max(wait_time, 0), SQS_MAX_WAIT_TIME)))
+
+        return [Message(message['Body'], message['ReceiptHandle']) for message in response.get('Messages', [])]
+
+    def ack(self, message: Message):
+        self.__client.delete_message(QueueUrl=self.__url, ReceiptHandle=message.receipt)
+
+
+class FileWorkQueue:
+    """
+    Folder in which each file is a message. Messages are claimed by renaming them, so several workers can share the
+    folder. Claimed messages that are never acknowledged are kept, so that they can be inspected
+    """
+    __CLAIMED_SUFFIX = '.claimed'
+    __POLL_INTERVAL = 1
+
+    def __init__(self, path: str):
+        self.__path = path
+        os.makedirs(path, exist_ok=True)
+
+    def send(self, body: str):
+        name = os.path.join(self.__path, '{}-{}'.format(time.time_ns(), uuid.uuid4().hex))
+
+        # Write the message under a temporary name first so that workers never read it half written
+        with open(name + '.tmp', 'w') as fd:
+            fd.write(body)
+
+        os.rename(name + '.tmp', name)
+
+    def __claim(self) -> [Message]:
+        for name in sorted(os.listdir(self.__path)):
+            if name.endswith(self.__CLAIMED_SUFFIX) or name.endswith('.tmp'):
+                continue
+
+            path = os.path.join(self.__path, name)
+
+            try:
+                os.rename(path, path + self.__CLAIMED_SUFFIX)
+            except FileNotFoundError:
+                # Claimed by another worker
+                continue
+
+            with open(path + self.__CLAIMED_SUFFIX) as fd:
+                return [Message(fd.read(), path)]
+
+        return []
+
+    def receive(self, wait_time: float) -> [Message]:
+        deadline = time.monotonic() + wait_time
+
+        while True:
+            messages = self.__claim()
+
+            if messages or time.monotonic() >= deadline:
+                return messages
+
+            time.sleep(min(self.__POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+    def ack(self, message: Message):
+        os.remove(message.receipt + self.__CLAIMED_SUFFIX)
+
+
+class InMemoryWorkQueue:
+    """
+    Queue that only lives in the memory of the process. Messages that are not acknowledged are kept in unacknowledged
+    """
+
+    def __init__(self, bodies: [str] = ()):
+        self.__messages = collections.deque(bodies)
+        self.unacknowledged = {}
+
+    def send(self, body: str):
+        self.__messages.append(body)
+
+    def receive(self, wait_time: float) -> [Message]:
+        if not self.__messages:
+            # Nobody else can send messages while the worker waits
+            time.sleep(wait_time)
+            return []
+
+        message = Message(self.__messages.popleft(), uuid.uuid4().hex)
+        self.unacknowledged[message.receipt] = message.body
+
+        return [message]
+
+    def ack(self, message: Message):
+        del self.unacknowledged[message.receipt]
+
+
+def open_work_queue(location: str):
+    """
+    :param location: URL of an SQS queue, or path of a folder of message files
+    """
+    url = urlparse(location)
+
+    if url.scheme == 'https' and url.netloc.startswith('sqs.'):
+        visibility_timeout = int(os.environ.get(ENV_VISIBILITY_TIMEOUT, DEFAULT_VISIBILITY_TIMEOUT))
+        return SQSWorkQueue(location, visibility_timeout)
+
+    return FileWorkQueue(url.path if url.scheme == 'file' else location)
+
+
+def parse_message(body: str) -> (str, str):
+    """
+    Extracts the file to analyse from a message. Messages are either {"bucket": ..., "key": ...} or the CloudTrail event
+    of the file being uploaded to the indexed data sources bucket, as sent by EventBridge
+    :return: tuple with the bucket and the key of the file
+    """
+    message = json.loads(body)
+
+    if 'detail' in message:
+        message = message['detail']['requestParameters']
+        return message['bucketName'], message['key']
+
+    return message['bucket'], message['key']
+
+
+def consume(queue, process, idle_timeout: float) -> dict:
+    """
+    Processes the files received from a queue until no message has been received for the idle timeout. Messages are
+    acknowledged once their file has been processed. Messages whose file cannot be processed are not acknowledged, so
+    SQS makes them visible again after the visibility timeout (or moves them to the dead-letter queue of the queue)
+    :param queue: queue to consume
+    :param process: function that receives the bucket and the key of a file and processes it
+    :param idle_timeout: seconds without receiving messages after which the worker stops
+    :return: dictionary with the number of processed and failed files
+    """
+    stats = {'processed': 0, 'failed': 0}
+    last_message_time = time.monotonic()
+
+    while True:
+        remaining = idle_timeout - (time.monotonic() - last_message_time)
+
+        if remaining <= 0:
+            return stats
+
+        for message in queue.receive(remaining):
+            last_message_time = time.monotonic()
+
+            try:
+                bucket, key = parse_message(message.body)
+                process(bucket, key)
+            except Exception as e:
+                print('Could not process message {}: {}'.format(message.body, e))
+                stats['failed'] += 1
+                continue
+
+            queue.ack(message)
+            stats['processed'] += 1
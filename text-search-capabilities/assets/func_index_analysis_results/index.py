@@ -4,17 +4,27 @@
 # Summary: script that updates the OpenSearch domain indexes with the results of the language analysis
 
 
+import contextlib
 import json
-import boto3
-import os
 
 from http import HTTPStatus
-from opensearchpy import OpenSearch, RequestsHttpConnection, helpers, AWSV4SignerAuth
 from language_analysis import constants
-from language_analysis.utils import system_config, s3
+from language_analysis.utils import system_config, s3, opensearch
 
 
 ERRORS_FOLDER_NAME = '/errors/'
+SUMMARIES_FOLDER_NAME = '/error-summaries/'
+
+# Painless script that sets the fields of the document to the ones received, replacing the objects they contain instead
+# of merging them, so counts of the previous analysis of the document that are missing from the new one do not remain
+REPLACE_FIELDS_SCRIPT = 'for (field in params.fields.entrySet()) { ctx._source[field.getKey()] = field.getValue() }'
+
+# Number of times the update of a document is retried when it is also being updated with the results of the other
+# analysis (e.g. its metrics and the summary of its errors)
+RETRY_ON_CONFLICT = 3
+
+# Maximum number of documents whose previous error examples are deleted with each delete by query request
+DELETE_EXAMPLES_MAX_DOCUMENTS = 1000
 
 
 class IndexationException(Exception):
@@ -23,76 +33,93 @@ class IndexationException(Exception):
         self.status = status
 
 
-def __get_credentials(region):
-    credentials = boto3.Session().get_credentials()
-    return AWSV4SignerAuth(credentials, region)
-
-
-def __get_domain(endpoint, auth):
-    return OpenSearch(
-        hosts=[{'host': endpoint, 'port': 443}],
-        http_auth=auth,
-        use_ssl=True,
-        verify_certs=True,
-        connection_class=RequestsHttpConnection
-    )
-
-
-def __generate_update_bulk_actions(documents: [dict], index: str) -> [dict]:
-    actions = []
-
+def __generate_update_bulk_actions(documents, index: str):
     for document in documents:
-        actions.append({
+        yield {
             '_op_type': 'update',
             '_index': index,
             '_id': document['id'],
+            'retry_on_conflict': RETRY_ON_CONFLICT,
             'doc': document
-        })
+        }
 
-    return actions
 
+def __generate_replace_bulk_actions(documents, index: str):
+    for document in documents:
+        yield {
+            '_op_type': 'update',
+            '_index': index,
+            '_id': document['id'],
+            'retry_on_conflict': RETRY_ON_CONFLICT,
+            'script': {
+                'source': REPLACE_FIELDS_SCRIPT,
+                'lang': 'painless',
+                'params': {'fields': document}
+            }
+        }
 
-def __generate_insert_bulk_actions(error_examples: [dict], index: str) -> [dict]:
-    actions = []
 
+def __generate_insert_bulk_actions(error_examples, index: str):
     for error in error_examples:
-        actions.append({
+        yield {
             '_op_type': 'index',
             '_index': index,
             '_type': 'language-error',
             '_id': error['id'],
             '_source': error
-        })
+        }
+
+
+def __delete_error_examples(domain, bucket: str, key: str, index: str):
+    """
+    Deletes the examples of the errors of the documents of a file found by their previous analysis, so the ones that
+    are not replaced by the new examples (e.g. the document has fewer errors of a rule) do not remain
+    """
+    with contextlib.closing(s3.retrieve_file_lines(bucket, key)) as lines:
+        document_ids = list(dict.fromkeys(json.loads(line)['document-id'] for line in lines))
 
-    return actions
+    for start in range(0, len(document_ids), DELETE_EXAMPLES_MAX_DOCUMENTS):
+        # The identifiers of the documents are matched as a whole, with the keyword field mapped for them
+        query = {'terms': {'document-id.keyword': document_ids[start:start + DELETE_EXAMPLES_MAX_DOCUMENTS]}}
+
+        # The index does not exist until the first examples are indexed
+        domain.delete_by_query(index=index, body={'query': query}, conflicts='proceed', ignore_unavailable=True)
 
 
 def handler(event, context):
     bucket = event['detail']['requestParameters']['bucketName']
     key = event['detail']['requestParameters']['key']
 
-    # Generate an array with the documents by reading the contents of the file in S3
-    documents = s3.retrieve_file_contents(bucket, key).split('\n')
+    # Retrieve the client of the Opensearch domain, whose connections are reused by warm invocations
+    domain = opensearch.get_domain(system_config.get_parameter(constants.CONFIG_PARAM_OPENSEARCH_DOMAIN_ENDPOINT))
+
+    # The examples of the language errors replace all the ones of the previous analysis of the documents
+    if ERRORS_FOLDER_NAME in key:
+        __delete_error_examples(domain, bucket, key, constants.INDEX_LANGUAGE_ERRORS)
 
-    # Convert the documents to dictionaries
-    documents = [json.loads(document) for document in documents]
+    # The documents are read from S3 and indexed in chunks sent in parallel as they are decoded, so only the chunks
+    # being sent are held in memory
+    with contextlib.closing(s3.retrieve_file_lines(bucket, key)) as lines:
+        documents = (json.loads(line) for line in lines)
 
-    # Establish a connection with the Opensearch domain
-    domain = __get_domain(system_config.get_parameter(constants.CONFIG_PARAM_OPENSEARCH_DOMAIN_ENDPOINT),
-                          __get_credentials(os.environ['AWS_REGION']))
+        # The examples of the language errors need to be indexed in the cluster
+        if ERRORS_FOLDER_NAME in key:
+            actions = __generate_insert_bulk_actions(documents, constants.INDEX_LANGUAGE_ERRORS)
+        # The summaries of the language errors replace the ones of the previous analysis of the documents
+        elif SUMMARIES_FOLDER_NAME in key:
+            actions = __generate_replace_bulk_actions(documents, constants.INDEX_DOCUMENTS)
+        # The previously indexed documents need to be updated in the cluster with the metrics
+        else:
+            actions = __generate_update_bulk_actions(documents, constants.INDEX_DOCUMENTS)
 
-    # The examples of the language errors need to be indexed in the cluster
-    if ERRORS_FOLDER_NAME in key:
-        response = helpers.bulk(domain, __generate_insert_bulk_actions(documents, constants.INDEX_LANGUAGE_ERRORS))
-    # The previously indexed documents need to be updated in the cluster with the analysis results
-    else:
-        response = helpers.bulk(domain, __generate_update_bulk_actions(documents, constants.INDEX_DOCUMENTS))
+        indexed, failed, errors = opensearch.parallel_bulk(domain, actions)
 
     # There were indexation errors
-    if response[1]:
-        raise IndexationException(message=json.dumps(response[1]), status=HTTPStatus.BAD_REQUEST)
+    if failed:
+        raise IndexationException(message=json.dumps({'failedCount': failed, 'errors': errors}),
+                                  status=HTTPStatus.BAD_REQUEST)
 
     return {
         'statusCode': HTTPStatus.OK,
-        'body': json.dumps({'indexedCount': response[0]})
+        'body': json.dumps({'indexedCount': indexed})
     }
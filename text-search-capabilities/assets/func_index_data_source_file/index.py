@@ -1,18 +1,22 @@
 #!/usr/bin/python
 # Author: Borja Pérez Guasch <bpguasch@amazon.com>
 # License: Apache 2.0
-# Summary: script that indexes document files in the Opensearch domain
+# Summary: script that indexes document files in the Opensearch domain. It can also validate the documents while
+# indexing them, so each file is read only once
 
 
+import contextlib
 import json
 import uuid
-import boto3
-import os
 
 from http import HTTPStatus
-from opensearchpy import OpenSearch, RequestsHttpConnection, helpers, AWSV4SignerAuth
 from language_analysis import constants
-from language_analysis.utils import system_config, s3
+from language_analysis.utils import system_config, s3, validation, opensearch
+from language_analysis.utils.validation import ValidationException, DocumentValidator
+
+
+# Compiled once per execution environment
+__document_validator = DocumentValidator()
 
 
 class IndexationException(Exception):
@@ -21,39 +25,42 @@ class IndexationException(Exception):
         self.status = status
 
 
-def __get_credentials(region):
-    credentials = boto3.Session().get_credentials()
-    return AWSV4SignerAuth(credentials, region)
-
-
-def __get_domain(endpoint, auth):
-    return OpenSearch(
-        hosts=[{'host': endpoint, 'port': 443}],
-        http_auth=auth,
-        use_ssl=True,
-        verify_certs=True,
-        connection_class=RequestsHttpConnection
-    )
-
-
 def __hydrate_document(document, data_source, key_id) -> dict:
     new_keys = {'source': data_source, 'id': key_id}
     return {**document, **new_keys}
 
 
-def __generate_bulk_actions(documents: [dict], index: str) -> [dict]:
-    actions = []
-
+def __generate_bulk_actions(documents, index: str):
     for document in documents:
-        actions.append({
+        yield {
             '_op_type': 'index',
             '_index': index,
             '_type': 'document',
             '_id': document['id'],
             '_source': document
-        })
+        }
+
+
+def __generate_uploaded_documents(documents, data_source: str, writer: s3.MultipartUploadWriter, ids: [str] = None):
+    """
+    Hydrates the documents as they are decoded, writing them to the indexed data sources bucket
+    :param ids: list to which the id of each document is appended before it is handed over to be indexed, or None
+    """
+    for document in documents:
+        document = __hydrate_document(document, data_source, str(uuid.uuid4()))
+        writer.write(document)
+
+        if ids is not None:
+            ids.append(document['id'])
+
+        yield document
 
-    return actions
+
+def __delete_documents(domain, ids: [str], index: str):
+    actions = ({'_op_type': 'delete', '_index': index, '_type': 'document', '_id': key_id} for key_id in ids)
+
+    # Documents that had not been sent yet are not found, which is not an error
+    opensearch.streaming_bulk(domain, actions, ignore_status=(HTTPStatus.NOT_FOUND,))
 
 
 def handler(event, context):
@@ -61,31 +68,83 @@ def handler(event, context):
     key = event['detail']['requestParameters']['key']
     data_source = key.split('/')[0]
 
-    # Generate an array with the documents by reading the contents of the file in S3
-    documents = s3.retrieve_file_contents(bucket, key).split('\n')
+    # Retrieve the client of the Opensearch domain, whose connections are reused by warm invocations
+    domain = opensearch.get_domain(system_config.get_parameter(constants.CONFIG_PARAM_OPENSEARCH_DOMAIN_ENDPOINT))
+
+    indexed_data_sources_bucket = system_config.get_parameter(constants.CONFIG_PARAM_INDEXED_DATA_SOURCES_BUCKET)
+
+    # The documents are read from S3, indexed in chunks sent in parallel and uploaded to the indexed data sources bucket
+    # as they are decoded, so only the chunks being sent are held in memory. The upload is aborted if an exception is
+    # raised
+    with contextlib.closing(s3.retrieve_file_lines(bucket, key)) as lines, \
+            s3.MultipartUploadWriter(indexed_data_sources_bucket, key) as writer:
+        documents = __generate_uploaded_documents((json.loads(line) for line in lines), data_source, writer)
+        indexed, failed, errors = opensearch.parallel_bulk(domain, __generate_bulk_actions(documents,
+                                                                                           constants.INDEX_DOCUMENTS))
+
+        # There were indexation errors
+        if failed:
+            raise IndexationException(message=json.dumps({'failedCount': failed, 'errors': errors}),
+                                      status=HTTPStatus.BAD_REQUEST)
+
+    return {
+        'statusCode': HTTPStatus.OK,
+        'body': json.dumps({'indexedCount': indexed})
+    }
+
+
+def validate_and_index_handler(event, context):
+    """
+    Validates and indexes a data source file in a single streaming pass. If a document is invalid, the documents of the
+    file that were already indexed are deleted, nothing is written to the indexed data sources bucket and the file is
+    moved to the invalid data sources bucket
+    """
+    bucket = event['detail']['requestParameters']['bucketName']
+    key = event['detail']['requestParameters']['key']
+    file_size = event['detail']['additionalEventData']['bytesTransferredIn']
+    file_name = key.split('/')[-1]
+    data_source = key.split('/')[0]
+
+    domain = None
+    ids = []
 
-    # Convert the documents to dictionaries and add to them some fields
-    documents = [__hydrate_document(json.loads(document),
-                                    data_source,
-                                    str(uuid.uuid4())) for document in documents]
+    try:
+        # Verify that the data source file is inside a folder in the bucket
+        validation.validate_key(key)
 
-    # Establish a connection with the Opensearch domain
-    domain = __get_domain(system_config.get_parameter(constants.CONFIG_PARAM_OPENSEARCH_DOMAIN_ENDPOINT),
-                          __get_credentials(os.environ['AWS_REGION']))
+        # Verify that the data source file is size is not 0 and does not exceed the maximum allowed
+        validation.validate_file_size(file_size, file_name)
 
-    # Send the request
-    response = helpers.bulk(domain, __generate_bulk_actions(documents, constants.INDEX_DOCUMENTS))
+        # Retrieve the client of the Opensearch domain, whose connections are reused by warm invocations
+        domain = opensearch.get_domain(system_config.get_parameter(constants.CONFIG_PARAM_OPENSEARCH_DOMAIN_ENDPOINT))
 
-    # There were indexation errors
-    if response[1]:
-        raise IndexationException(message=json.dumps(response[1]), status=HTTPStatus.BAD_REQUEST)
+        indexed_data_sources_bucket = system_config.get_parameter(constants.CONFIG_PARAM_INDEXED_DATA_SOURCES_BUCKET)
 
-    # Upload the indexed documents to S3
-    contents = '\n'.join([json.dumps(document) for document in documents])
-    indexed_data_sources_bucket = system_config.get_parameter(constants.CONFIG_PARAM_INDEXED_DATA_SOURCES_BUCKET)
-    s3.upload_contents(indexed_data_sources_bucket, key, contents)
+        # The documents are indexed and uploaded as they are validated. The upload is aborted if an exception is raised
+        with contextlib.closing(s3.retrieve_file_lines(bucket, key)) as lines, \
+                s3.MultipartUploadWriter(indexed_data_sources_bucket, key) as writer:
+            documents = (__document_validator.validate_line(line_number, line)
+                         for line_number, line in enumerate(lines, 1))
+            documents = __generate_uploaded_documents(documents, data_source, writer, ids)
+            indexed, failed, errors = opensearch.parallel_bulk(domain,
+                                                               __generate_bulk_actions(documents,
+                                                                                       constants.INDEX_DOCUMENTS))
+
+            # There were indexation errors
+            if failed:
+                raise IndexationException(message=json.dumps({'failedCount': failed, 'errors': errors}),
+                                          status=HTTPStatus.BAD_REQUEST)
+    except ValidationException as e:
+        # Delete the documents of the file that were already indexed
+        if ids:
+            __delete_documents(domain, ids, constants.INDEX_DOCUMENTS)
+
+        # Move the invalid file to the invalid data sources bucket, deleting it from the data sources bucket
+        s3.move_file(bucket, system_config.get_parameter(constants.CONFIG_PARAM_INVALID_DATA_SOURCES_BUCKET), key)
+
+        raise e
 
     return {
         'statusCode': HTTPStatus.OK,
-        'body': json.dumps({'indexedCount': response[0]})
+        'body': json.dumps({'indexedCount': indexed})
     }
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: script that merges the results of the shards in which the analysed files were split, and uploads them to
+# the analysis results bucket with the same keys as if the files had been analysed by a single job
+
+
+import json
+import os
+
+from http import HTTPStatus
+from language_analysis import constants
+from language_analysis.utils import system_config, s3, clients
+
+
+# Folders of the analysis results and whether their results file is uploaded when there are no results
+ANALYSIS_FOLDERS = {
+    'metrics': True,
+    'errors': False,
+    'error-summaries': False
+}
+
+
+def __list_partial_results(client, bucket: str, prefix: str) -> [str]:
+    keys = []
+    paginator = client.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(entry['Key'] for entry in page.get('Contents', []))
+
+    # The key of each shard ends with its zero-padded index
+    return sorted(keys)
+
+
+def __generate_results_key(key: str, folder: str) -> str:
+    components = key.split('/')
+    components.insert(-1, folder)
+    return '/'.join(components)
+
+
+def __merge_partial_results(client, partial_results_bucket: str, partial_keys: [str], writer: s3.MultipartUploadWriter):
+    for partial_key in partial_keys:
+        response = client.get_object(Bucket=partial_results_bucket, Key=partial_key)
+
+        for line in s3.iter_raw_lines(response['Body']):
+            if line.strip():
+                writer.write_line(line)
+
+
+def __delete_partial_results(client, bucket: str, prefix: str):
+    keys = [{'Key': key} for key in __list_partial_results(client, bucket, prefix)]
+
+    # Objects can be deleted in batches of up to 1000 keys
+    for i in range(0, len(keys), 1000):
+        client.delete_objects(Bucket=bucket, Delete={'Objects': keys[i:i + 1000], 'Quiet': True})
+
+
+def handler(event, context):
+    client = clients.get_client('s3')
+    partial_results_bucket = os.environ['PARTIAL_RESULTS_BUCKET']
+    analysis_results_bucket = system_config.get_parameter(constants.CONFIG_PARAM_ANALYSIS_RESULTS_BUCKET)
+    merged = 0
+
+    for key in event['keys']:
+        for folder, upload_empty in ANALYSIS_FOLDERS.items():
+            prefix = '{}/{}/{}/'.format(event['run_id'], folder, key)
+            partial_keys = __list_partial_results(client, partial_results_bucket, prefix)
+
+            with s3.MultipartUploadWriter(analysis_results_bucket, __generate_results_key(key, folder),
+                                          skip_empty=not upload_empty) as writer:
+                __merge_partial_results(client, partial_results_bucket, partial_keys, writer)
+
+            merged += 1
+
+    __delete_partial_results(client, partial_results_bucket, event['run_id'] + '/')
+
+    return {
+        'statusCode': HTTPStatus.OK,
+        'body': json.dumps({'mergedCount': merged})
+    }
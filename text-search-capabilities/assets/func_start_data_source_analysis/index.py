@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: script that groups the indexed data source files received within a time window and starts one analysis
+# for each group, so that the analysis jobs load their models once per group instead of once per file. The files of
+# large groups are split in shards analysed by array jobs
+
+
+import json
+import os
+
+from http import HTTPStatus
+from language_analysis import constants
+from language_analysis.utils import clients
+
+
+def __group_keys_by_bucket(records: [dict]) -> dict:
+    groups = {}
+
+    for record in records:
+        # Each message contains the CloudTrail event of a file being uploaded to the indexed data sources bucket
+        event = json.loads(record['body'])
+        bucket = event['detail']['requestParameters']['bucketName']
+        key = event['detail']['requestParameters']['key']
+
+        keys = groups.setdefault(bucket, [])
+
+        # The same file may be uploaded several times within the window
+        if key not in keys:
+            keys.append(key)
+
+    return groups
+
+
+def __count_shards(bucket: str, keys: [str]) -> int:
+    """
+    :return: number of shards in which the files are split, or 1 if their shards would be smaller than
+    ANALYSIS_SHARD_MIN_BYTES, so they are analysed by a single job
+    """
+    client = clients.get_client('s3')
+    size = sum(client.head_object(Bucket=bucket, Key=key)['ContentLength'] for key in keys)
+
+    return constants.ANALYSIS_SHARDS if size >= constants.ANALYSIS_SHARDS * constants.ANALYSIS_SHARD_MIN_BYTES else 1
+
+
+def handler(event, context):
+    client = clients.get_client('stepfunctions')
+    executions = 0
+
+    for bucket, keys in __group_keys_by_bucket(event['Records']).items():
+        for i in range(0, len(keys), constants.ANALYSIS_BATCH_MAX_FILES):
+            batch_keys = keys[i:i + constants.ANALYSIS_BATCH_MAX_FILES]
+
+            client.start_execution(stateMachineArn=os.environ['STATE_MACHINE_ARN'],
+                                   input=json.dumps({
+                                       'bucket': bucket,
+                                       'keys': batch_keys,
+                                       'shards': __count_shards(bucket, batch_keys)
+                                   }))
+            executions += 1
+
+    return {
+        'statusCode': HTTPStatus.OK,
+        'body': json.dumps({'executionsStarted': executions})
+    }
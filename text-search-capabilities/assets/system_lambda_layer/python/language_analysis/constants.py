@@ -33,6 +33,8 @@ CONFIG_PARAM_CONFIG_FILES_BUCKET = '/{}/configFilesBucket'.format(SSM_PARAMS_PAT
 CONFIG_PARAM_FOREIGNISMS = '/{}/foreignisms'.format(SSM_PARAMS_PATH)
 CONFIG_PARAM_LANGUAGE = '/{}/language'.format(SSM_PARAMS_PATH)
 CONFIG_PARAM_OPENSEARCH_DOMAIN_ENDPOINT = '/{}/opensearchDomainEndpoint'.format(SSM_PARAMS_PATH)
+CONFIG_PARAM_ERRORS_PROFILE = '/{}/errorsProfile'.format(SSM_PARAMS_PATH)
+CONFIG_PARAM_ERRORS_PROFILE_BY_SOURCE = '/{}/errorsProfileBySource'.format(SSM_PARAMS_PATH)
 
 # ----------------------- SPACY ------------------------ #
 SPACY_MODE_ACCURACY = 'Accuracy'
@@ -40,6 +42,35 @@ SPACY_MODE_EFFICIENCY = 'Efficiency'
 SPACY_SUPPORTED_LANGUAGES = ['ca', 'zh', 'da', 'nl', 'en', 'fr', 'de', 'el', 'it',
                              'ja', 'pl', 'pt', 'ro', 'ru', 'es']
 
+# ---------------- DATA SOURCE ANALYSIS ---------------- #
+# Indexed data source files received within the window are analysed by the same jobs, up to a maximum number of files
+ANALYSIS_BATCH_WINDOW_MINUTES = 5
+ANALYSIS_BATCH_MAX_FILES = 50
+
+# Number of shards in which each file is split, each of them analysed by a child of an AWS Batch array job (minimum 2)
+ANALYSIS_SHARDS = 4
+
+# Minimum size of the shards of the files of an analysis. Files whose shards would be smaller are analysed by a single
+# job, since loading the models in each child would take longer than the time saved
+ANALYSIS_SHARD_MIN_BYTES = 16 * 1024 * 1024
+
+# -------------------- LANGUAGETOOL -------------------- #
+# Profiles of the rules checked by the errors analysis
+ERRORS_PROFILE_FULL = 'full'
+ERRORS_PROFILE_NO_STYLE = 'no-style'
+ERRORS_PROFILE_SPELLING_GRAMMAR = 'spelling+grammar'
+ERRORS_PROFILE_TYPOGRAPHY = 'typography-only'
+ERRORS_PROFILES = [ERRORS_PROFILE_FULL, ERRORS_PROFILE_NO_STYLE, ERRORS_PROFILE_SPELLING_GRAMMAR,
+                   ERRORS_PROFILE_TYPOGRAPHY]
+
 # -------------------- OPENSEARCH ---------------------- #
 INDEX_DOCUMENTS = 'documents'
 INDEX_LANGUAGE_ERRORS = 'language-errors'
+
+# Maximum number of actions and of bytes sent in each bulk request. The bytes are below the maximum size of an HTTP
+# request of the smallest instance types of the domain (10 MB)
+BULK_CHUNK_SIZE = 500
+BULK_MAX_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Number of bulk requests sent at the same time by the indexation functions
+BULK_THREAD_COUNT = 4
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: module with the clients of the AWS services, created once per process so the invocations of warm Lambda
+# functions reuse them and their connections
+
+import threading
+import boto3
+
+
+__session = None
+__clients = {}
+
+# boto3 sessions are not thread safe, so clients are created one at a time
+__lock = threading.Lock()
+
+
+def get_session() -> boto3.Session:
+    global __session
+
+    with __lock:
+        if __session is None:
+            __session = boto3.Session()
+
+        return __session
+
+
+def get_client(service_name: str, region_name: str = None):
+    """
+    :return: the client of the service, created the first time it is requested. Clients are thread safe, so the same
+    client is shared by all the threads of the process
+    """
+    client = __clients.get((service_name, region_name))
+
+    if client is None:
+        session = get_session()
+
+        with __lock:
+            client = __clients.get((service_name, region_name))
+
+            if client is None:
+                client = __clients[(service_name, region_name)] = session.client(service_name,
+                                                                                 region_name=region_name)
+
+    return client
+
+
+def get_credentials():
+    """
+    :return: the credentials of the process. Temporary credentials (e.g. those of the containers of AWS Batch jobs)
+    are refreshed by botocore when they are about to expire, each time they are read
+    """
+    return get_session().get_credentials()
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: module with the client of the OpenSearch domain, created once per process, and helper methods to send bulk
+# requests to it
+
+import collections
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth, helpers
+from opensearchpy.helpers import actions as bulk_actions
+from requests.adapters import HTTPAdapter
+
+from language_analysis import constants
+from language_analysis.utils import clients
+
+
+# Environment variables with the maximum number of actions and of bytes sent in each bulk request, and the number of
+# bulk requests sent at the same time
+ENV_BULK_CHUNK_SIZE = 'BULK_CHUNK_SIZE'
+ENV_BULK_MAX_CHUNK_BYTES = 'BULK_MAX_CHUNK_BYTES'
+ENV_BULK_THREAD_COUNT = 'BULK_THREAD_COUNT'
+
+# Number of failed actions whose errors are reported
+MAX_REPORTED_ERRORS = 100
+
+
+__domains = {}
+__domains_lock = threading.Lock()
+
+
+class PooledRequestsHttpConnection(RequestsHttpConnection):
+    """
+    Connection to the domain that keeps up to pool_maxsize connections alive, so bulk requests sent at the same time
+    and later invocations of warm Lambda functions reuse them instead of opening new ones
+    """
+
+    def __init__(self, *args, pool_maxsize: int = 10, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+
+def get_domain(endpoint: str) -> OpenSearch:
+    """
+    :return: client of the domain, created the first time it is requested. Its requests are signed with the credentials
+    of the process, which are refreshed when they are about to expire
+    """
+    with __domains_lock:
+        domain = __domains.get(endpoint)
+
+        if domain is None:
+            domain = __domains[endpoint] = OpenSearch(
+                hosts=[{'host': endpoint, 'port': 443}],
+                http_auth=AWSV4SignerAuth(clients.get_credentials(), os.environ['AWS_REGION']),
+                use_ssl=True,
+                verify_certs=True,
+                connection_class=PooledRequestsHttpConnection,
+                pool_maxsize=get_bulk_thread_count()
+            )
+
+        return domain
+
+
+def get_bulk_chunk_size() -> int:
+    return int(os.environ.get(ENV_BULK_CHUNK_SIZE, constants.BULK_CHUNK_SIZE))
+
+
+def get_bulk_max_chunk_bytes() -> int:
+    return int(os.environ.get(ENV_BULK_MAX_CHUNK_BYTES, constants.BULK_MAX_CHUNK_BYTES))
+
+
+def get_bulk_thread_count() -> int:
+    return int(os.environ.get(ENV_BULK_THREAD_COUNT, constants.BULK_THREAD_COUNT))
+
+
+def __summarise_results(results, ignore_status) -> (int, int, [dict]):
+    succeeded = 0
+    failed = 0
+    errors = []
+
+    for ok, item in results:
+        if ok:
+            succeeded += 1
+        # Each item is a dictionary whose only key is the type of the action
+        elif next(iter(item.values())).get('status') not in ignore_status:
+            failed += 1
+
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(item)
+
+    return succeeded, failed, errors
+
+
+def __send_chunk(client, chunk_actions: [str], chunk_data: [tuple]) -> [tuple]:
+    return list(bulk_actions._process_bulk_chunk(client, chunk_actions, chunk_data, raise_on_error=False))
+
+
+def __parallel_bulk_results(client, actions, thread_count: int, chunk_size: int, max_chunk_bytes: int):
+    """
+    Sends the chunks of actions from a pool of threads, with at most thread_count requests in flight
+    :return: generator of the results of the actions, in the same order as the actions
+    """
+    chunks = bulk_actions._chunk_actions(map(helpers.expand_action, actions), chunk_size, max_chunk_bytes,
+                                         client.transport.serializer)
+    pending_chunks = collections.deque()
+
+    # Leaving the with block waits for the requests in flight, so no request is sent after an exception is raised
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        for chunk_data, chunk_actions in chunks:
+            # Wait for the oldest request so that memory stays bounded
+            if len(pending_chunks) >= thread_count:
+                yield from pending_chunks.popleft().result()
+
+            pending_chunks.append(executor.submit(__send_chunk, client, chunk_actions, chunk_data))
+
+        while pending_chunks:
+            yield from pending_chunks.popleft().result()
+
+
+def streaming_bulk(client, actions, chunk_size: int = None, max_chunk_bytes: int = None, ignore_status=()):
+    """
+    Sends the actions in bulk requests of at most chunk_size actions and max_chunk_bytes bytes, consuming them as the
+    requests are sent, so only one chunk of actions is held in memory
+    :param actions: iterable of actions, usually a generator
+    :param ignore_status: statuses of the failed actions that are not errors (e.g. 404 when deleting documents)
+    :return: tuple with the number of successful actions, the number of failed actions and the errors of the first
+    MAX_REPORTED_ERRORS failed actions
+    """
+    results = helpers.streaming_bulk(client, actions,
+                                     chunk_size=chunk_size or get_bulk_chunk_size(),
+                                     max_chunk_bytes=max_chunk_bytes or get_bulk_max_chunk_bytes(),
+                                     raise_on_error=False)
+
+    return __summarise_results(results, ignore_status)
+
+
+def parallel_bulk(client, actions, thread_count: int = None, chunk_size: int = None, max_chunk_bytes: int = None,
+                  ignore_status=()):
+    """
+    Same as streaming_bulk, but sends up to thread_count bulk requests at the same time, so the throughput is not
+    limited by the latency of each request. helpers.parallel_bulk is not used because its thread pool needs shared
+    memory, which is not available in Lambda functions
+    :return: tuple with the number of successful actions, the number of failed actions and the errors of the first
+    MAX_REPORTED_ERRORS failed actions
+    """
+    thread_count = thread_count or get_bulk_thread_count()
+
+    if thread_count == 1:
+        return streaming_bulk(client, actions, chunk_size, max_chunk_bytes, ignore_status)
+
+    results = __parallel_bulk_results(client, actions, thread_count,
+                                      chunk_size or get_bulk_chunk_size(),
+                                      max_chunk_bytes or get_bulk_max_chunk_bytes())
+
+    return __summarise_results(results, ignore_status)
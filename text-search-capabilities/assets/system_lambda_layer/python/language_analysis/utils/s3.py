@@ -3,20 +3,240 @@
 # License: Apache 2.0
 # Summary: module with helper methods to interact with S3
 
-import boto3
+import collections
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+
+from language_analysis.utils import clients
+
+
+# Size of the parts in which files are uploaded to S3 by MultipartUploadWriter
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+
+# Size of the chunks read when streaming files from S3
+STREAM_CHUNK_SIZE = 1024 * 1024
 
 
 def retrieve_file_contents(bucket: str, key: str) -> str:
-    client = boto3.client('s3')
+    client = clients.get_client('s3')
     response = client.get_object(Bucket=bucket, Key=key)
     return response['Body'].read().decode('utf-8')
 
 
+def retrieve_file_lines(bucket: str, key: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Streams a text file from S3 line by line, so only one chunk of the file is held in memory. The connection is closed
+    when the generator is closed, without reading the rest of the file
+    :return: generator of the same lines as splitting the whole file by its line breaks
+    """
+    client = clients.get_client('s3')
+    body = client.get_object(Bucket=bucket, Key=key)['Body']
+
+    try:
+        yield from iter_lines(body, chunk_size)
+    finally:
+        body.close()
+
+
+def retrieve_shard_lines(bucket: str, key: str, index: int, shards: int, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Streams the lines of one of the shards of a text file. The file is split in byte ranges of the same size, and each
+    line belongs to the shard in whose range it starts, so every line is read by exactly one shard
+    :param index: index of the shard, starting at 0
+    :param shards: number of shards in which the file is split
+    :return: generator of decoded lines, without the line break
+    """
+    client = clients.get_client('s3')
+    size = client.head_object(Bucket=bucket, Key=key)['ContentLength']
+
+    start = size * index // shards
+    end = size * (index + 1) // shards
+
+    if start >= end:
+        return
+
+    # Reading from the byte before the range tells whether the first line of the range starts at its beginning or
+    # belongs to the previous shard
+    position = max(start - 1, 0)
+    body = client.get_object(Bucket=bucket, Key=key, Range='bytes={}-'.format(position))['Body']
+
+    try:
+        lines = iter_raw_lines(body, chunk_size)
+
+        if start:
+            position += len(next(lines)) + 1
+
+        for line in lines:
+            if position >= end:
+                break
+
+            position += len(line) + 1
+            yield line.decode('utf-8')
+    finally:
+        body.close()
+
+
+def move_file(source_bucket: str, destination_bucket: str, key: str):
+    """
+    Moves a file to another bucket, keeping its key
+    """
+    copy_source = {
+        'Bucket': source_bucket,
+        'Key': key
+    }
+
+    clients.get_client('s3').copy(copy_source, destination_bucket, key)
+    delete_file(source_bucket, key)
+
+
+def delete_file(bucket: str, key: str):
+    client = clients.get_client('s3')
+    client.delete_object(Bucket=bucket, Key=key)
+
+
 def upload_contents(bucket: str, key: str, contents: str):
-    client = boto3.client('s3')
+    client = clients.get_client('s3')
 
     return client.put_object(
         Body=contents.encode('ascii'),
         Bucket=bucket,
         Key=key
     )
+
+
+def iter_raw_lines(stream, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Reads a binary stream in chunks and splits it into lines
+    :return: generator of lines as bytes, without the line break
+    """
+    pending = b''
+
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+
+        yield from lines
+
+    yield pending
+
+
+def iter_lines(stream, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Reads a binary stream in chunks and splits it into lines. Lines are split before being decoded, so multi-byte
+    UTF-8 characters split across chunks are decoded correctly (the byte of a line break never appears inside them)
+    :return: generator of decoded lines, without the line break
+    """
+    for line in iter_raw_lines(stream, chunk_size):
+        yield line.decode('utf-8')
+
+
+class MultipartUploadWriter:
+    """
+    Serialises documents as JSON lines and uploads them to S3 as they are produced. The contents are sent as the parts
+    of a multipart upload from background threads, so the upload overlaps with the generation of the documents. Files
+    smaller than one part are uploaded with a single request. If an exception is raised inside the with block, the
+    upload is aborted and no object is created
+    """
+
+    def __init__(self, bucket: str, key: str, part_size: int = UPLOAD_PART_SIZE, max_pending_parts: int = 2,
+                 skip_empty: bool = False):
+        """
+        :param part_size: size in bytes of each part. All the parts but the last one must be at least 5 MB
+        :param max_pending_parts: maximum number of parts held in memory while they are being uploaded
+        :param skip_empty: do not create the object if no document is written
+        """
+        self.bucket = bucket
+        self.key = key
+        self.count = 0
+
+        self.__client = clients.get_client('s3')
+        self.__part_size = part_size
+        self.__max_pending_parts = max_pending_parts
+        self.__skip_empty = skip_empty
+        self.__executor = None
+        self.__upload_id = None
+        self.__buffer = []
+        self.__buffer_size = 0
+        self.__pending_parts = collections.deque()
+        self.__parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, document: dict):
+        self.write_line(json.dumps(document).encode('ascii'))
+
+    def write_line(self, line: bytes):
+        """
+        Writes a document that is already serialised as a JSON line, without the line break
+        """
+        # Documents are separated by a line break, without one after the last document
+        if self.count:
+            line = b'\n' + line
+
+        self.__buffer.append(line)
+        self.__buffer_size += len(line)
+        self.count += 1
+
+        if self.__buffer_size >= self.__part_size:
+            self.__flush()
+
+    def __upload_part(self, part_number: int, body: bytes) -> dict:
+        response = self.__client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.__upload_id,
+                                             PartNumber=part_number, Body=body)
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def __flush(self):
+        body = b''.join(self.__buffer)
+        self.__buffer = []
+        self.__buffer_size = 0
+
+        if self.__upload_id is None:
+            self.__upload_id = self.__client.create_multipart_upload(Bucket=self.bucket, Key=self.key)['UploadId']
+            self.__executor = ThreadPoolExecutor(max_workers=self.__max_pending_parts)
+
+        # Wait for the oldest parts to be uploaded so that memory stays bounded
+        while len(self.__pending_parts) >= self.__max_pending_parts:
+            self.__parts.append(self.__pending_parts.popleft().result())
+
+        part_number = len(self.__parts) + len(self.__pending_parts) + 1
+        self.__pending_parts.append(self.__executor.submit(self.__upload_part, part_number, body))
+
+    def close(self):
+        # Small files are uploaded with a single request
+        if self.__upload_id is None:
+            if self.count or not self.__skip_empty:
+                self.__client.put_object(Body=b''.join(self.__buffer), Bucket=self.bucket, Key=self.key)
+            return
+
+        try:
+            if self.__buffer:
+                self.__flush()
+
+            while self.__pending_parts:
+                self.__parts.append(self.__pending_parts.popleft().result())
+        except Exception:
+            self.abort()
+            raise
+
+        self.__executor.shutdown()
+        self.__client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.__upload_id,
+                                                MultipartUpload={'Parts': self.__parts})
+
+    def abort(self):
+        if self.__upload_id is None:
+            return
+
+        # Parts still being uploaded would otherwise be kept by S3 after aborting
+        for part in self.__pending_parts:
+            part.cancel()
+
+        self.__executor.shutdown()
+        self.__client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.__upload_id)
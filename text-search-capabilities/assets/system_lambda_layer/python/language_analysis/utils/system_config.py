@@ -1,17 +1,127 @@
 #!/usr/bin/python
 # Author: Borja Pérez Guasch <bpguasch@amazon.com>
 # License: Apache 2.0
-# Summary: module with helper methods to retrieve and set System Manager Parameter Store parameters
+# Summary: module with helper methods to retrieve and set System Manager Parameter Store parameters. Parameters are
+# retrieved together and cached by each process, so warm invocations of the Lambda functions do not request them again
 
 
-import boto3
+import json
+import os
+import threading
+import time
+
+from language_analysis import constants
+from language_analysis.utils import clients
+
+
+# Seconds for which the values of the parameters are cached
+ENV_CONFIG_TTL_SECONDS = 'CONFIG_TTL_SECONDS'
+DEFAULT_CONFIG_TTL_SECONDS = 300
+
+# Path of a JSON file with the values of some parameters by name, which are used instead of the ones in Parameter
+# Store (e.g. to run the functions offline)
+ENV_CONFIG_FILE = 'CONFIG_FILE'
+
+__loader = None
+__loader_lock = threading.Lock()
+
+
+class ConfigLoader:
+    """
+    Values of the configuration parameters under a path of Parameter Store. They are all retrieved with a single
+    GetParametersByPath request and cached for ttl seconds, so the parameters are not requested one by one, nor on
+    every invocation. Parameters can also be read from a local JSON file, which takes precedence over Parameter Store
+    """
+
+    def __init__(self, client, path: str, ttl: float, override_file: str = None):
+        """
+        :param client: boto3 client of SSM
+        :param path: path of the parameters, e.g. /language-analysis
+        :param ttl: seconds during which the retrieved values are used before retrieving them again
+        :param override_file: path of a JSON object with the values of some parameters by name, or None
+        """
+        self.__client = client
+        self.__path = path
+        self.__ttl = ttl
+        self.__overrides = {}
+        self.__parameters = None
+        self.__loaded_at = 0
+        self.__lock = threading.Lock()
+
+        if override_file:
+            with open(override_file) as file:
+                self.__overrides = json.load(file)
+
+    def __load(self) -> dict:
+        parameters = {}
+        paginator = self.__client.get_paginator('get_parameters_by_path')
+
+        for page in paginator.paginate(Path=self.__path, Recursive=True):
+            for parameter in page['Parameters']:
+                parameters[parameter['Name']] = parameter['Value']
+
+        return parameters
+
+    def get_parameters(self) -> dict:
+        """
+        :return: the values of the parameters under the path by name, retrieved again if they are older than the TTL
+        """
+        with self.__lock:
+            if self.__parameters is None or time.monotonic() - self.__loaded_at >= self.__ttl:
+                self.__parameters = self.__load()
+                self.__loaded_at = time.monotonic()
+
+            return {**self.__parameters, **self.__overrides}
+
+    def get(self, name: str) -> str:
+        # Parameters in the local file are never requested, so runs that only need those can be offline
+        if name in self.__overrides:
+            return self.__overrides[name]
+
+        value = self.get_parameters().get(name)
+
+        # Parameters outside the path are requested on their own, and so are the missing ones, so SSM raises the same
+        # error as when parameters were requested one by one
+        if value is None:
+            value = self.__client.get_parameter(Name=name)['Parameter']['Value']
+
+        return value
+
+    def set(self, name: str, value: str):
+        """
+        Updates the cached value of a parameter after it is changed by this process
+        """
+        with self.__lock:
+            if self.__parameters is not None:
+                self.__parameters[name] = value
+
+    def invalidate(self):
+        with self.__lock:
+            self.__parameters = None
+
+
+def get_loader() -> ConfigLoader:
+    """
+    :return: the loader of the parameters of the system, configured through the environment variables of the process
+    and created the first time it is requested
+    """
+    global __loader
+
+    with __loader_lock:
+        if __loader is None:
+            __loader = ConfigLoader(clients.get_client('ssm'),
+                                    '/' + constants.SSM_PARAMS_PATH,
+                                    float(os.environ.get(ENV_CONFIG_TTL_SECONDS, DEFAULT_CONFIG_TTL_SECONDS)),
+                                    os.environ.get(ENV_CONFIG_FILE))
+
+        return __loader
 
 
 def put_parameter(name: str, value):
-    client = boto3.client('ssm')
+    client = clients.get_client('ssm')
     client.put_parameter(Name=name, Value=value)
+    get_loader().set(name, value)
 
 
 def get_parameter(name: str):
-    client = boto3.client('ssm')
-    return client.get_parameter(Name=name)['Parameter']['Value']
+    return get_loader().get(name)
@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: module with the validations of data source files, and the validator of their documents, compiled once from
+# the required fields and the date format of the documents
+
+import datetime
+import json
+import re
+
+from http import HTTPStatus
+
+from language_analysis import constants
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+ERR_DATA_SOURCE_FILE_EXCEEDS_MAX_SIZE = 'The size of data source file {} ({} MB) exceeds the maximum allowed \
+size of {} MB.'
+ERR_EMPTY_DATA_SOURCE_FILE = 'The data source file {} is empty.'
+ERR_DATA_SOURCE_FILE_NOT_INSIDE_FOLDER = 'All data source files must be inside a folder with the name of the data \
+source.'
+ERR_INVALID_DOCUMENT_FORMAT = 'Invalid document at line {}. Data source files must contain one JSON object per line \
+with the fields {}'.format('{}', constants.REQUIRED_DOCUMENT_FIELDS)
+ERR_MISSING_DOCUMENT_FIELD = 'Invalid document at line {}. Missing {} field.'
+ERR_EMPTY_DOCUMENT_FIELD = 'Invalid document at line {}. Field {} is empty.'
+ERR_INVALID_DOCUMENT_FIELD_TYPE = 'Invalid document at line {}. Field {} must be a string ({} found).'
+ERR_INVALID_DOCUMENT_DATE_FIELD_FORMAT = 'Invalid document at line {}. Field {} does not match format {}.'
+
+# Regular expressions of the date directives, the same ones used by datetime.strptime
+DATE_DIRECTIVES = {
+    'Y': r'(?P<Y>\d\d\d\d)',
+    'm': r'(?P<m>1[0-2]|0[1-9]|[1-9])',
+    'd': r'(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])'
+}
+
+DAYS_IN_MONTH = [0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+class ValidationException(Exception):
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+def validate_key(key: str) -> None:
+    """
+    Verifies that the data source file is inside a folder, whose name is the name of the data source
+    """
+    components = key.split('/')
+
+    if len(components) == 1:
+        raise ValidationException(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                  message=ERR_DATA_SOURCE_FILE_NOT_INSIDE_FOLDER)
+
+
+def validate_file_size(file_size, file_name: str) -> None:
+    """
+    Verifies that the size of the data source file is not 0 and does not exceed the maximum allowed
+    :param file_size: size of the file in bytes
+    """
+    # Divide to get the size in MB
+    file_size /= 1000000
+
+    if file_size == 0:
+        raise ValidationException(message=ERR_EMPTY_DATA_SOURCE_FILE.format(file_name), status=HTTPStatus.BAD_REQUEST)
+
+    if file_size > constants.DATA_SOURCE_FILE_MAX_SIZE_MB:
+        raise ValidationException(status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                  message=ERR_DATA_SOURCE_FILE_EXCEEDS_MAX_SIZE.
+                                  format(file_name, file_size, constants.DATA_SOURCE_FILE_MAX_SIZE_MB))
+
+
+def compile_date_format(date_format: str):
+    """
+    Translates a date format made of the %Y, %m and %d directives into the regular expression datetime.strptime
+    matches dates with
+    :return: the compiled regular expression, or None if the format contains other directives
+    """
+    pattern = ''
+    components = re.split(r'(%.)', date_format)
+
+    for component in components:
+        if not component.startswith('%'):
+            # datetime.strptime matches any whitespace where the format has whitespace
+            pattern += r'\s+'.join(re.escape(part) for part in re.split(r'\s+', component))
+        elif component[1:] in DATE_DIRECTIVES:
+            pattern += DATE_DIRECTIVES[component[1:]]
+        else:
+            return None
+
+    if sorted(component for component in components if component.startswith('%')) != ['%Y', '%d', '%m']:
+        return None
+
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def decode_document(line: str):
+    """
+    Decodes a JSON document with orjson when it is available. orjson rejects some documents that json accepts
+    (e.g. NaN values), so they are decoded again with json to accept the same documents
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+
+    return json.loads(line)
+
+
+class DocumentValidator:
+    """
+    Verifies that the documents contain the required fields as non-empty strings and that their date matches the date
+    format. Dates are matched with a precompiled regular expression and a calendar check instead of datetime.strptime,
+    accepting the same dates
+    """
+
+    def __init__(self, required_fields: [str] = None, date_field: str = constants.DOCUMENT_FIELD_DATE,
+                 date_format: str = constants.DOCUMENT_FIELD_DATE_FORMAT):
+        self.__required_fields = tuple(required_fields or constants.REQUIRED_DOCUMENT_FIELDS)
+        self.__date_field = date_field
+        self.__date_format = date_format
+        self.__date_regex = compile_date_format(date_format)
+
+    def __is_valid_date(self, value: str) -> bool:
+        if self.__date_regex is None:
+            try:
+                datetime.datetime.strptime(value, self.__date_format)
+            except ValueError:
+                return False
+
+            return True
+
+        match = self.__date_regex.match(value)
+
+        # The whole value must match, as datetime.strptime does not allow unconverted data
+        if match is None or match.end() != len(value):
+            return False
+
+        year, month, day = int(match.group('Y')), int(match.group('m')), int(match.group('d'))
+        leap_day = month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+        return year >= 1 and day <= DAYS_IN_MONTH[month] + leap_day
+
+    def validate_document(self, line_number: int, document):
+        for field in self.__required_fields:
+            # Verify that the document contains the field
+            if field not in document:
+                raise ValidationException(status=HTTPStatus.BAD_REQUEST,
+                                          message=ERR_MISSING_DOCUMENT_FIELD.format(line_number, field))
+
+            value = document[field]
+
+            # Verify that the field is a string
+            if type(value) != str:
+                raise ValidationException(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          message=ERR_INVALID_DOCUMENT_FIELD_TYPE.
+                                          format(line_number, field, value.__class__.__name__))
+
+            # Verify that the field is not empty
+            if not value:
+                raise ValidationException(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          message=ERR_EMPTY_DOCUMENT_FIELD.format(line_number, field))
+
+        # Verify that the date field is properly formatted
+        if not self.__is_valid_date(document[self.__date_field]):
+            raise ValidationException(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                      message=ERR_INVALID_DOCUMENT_DATE_FIELD_FORMAT.
+                                      format(line_number, self.__date_field, self.__date_format))
+
+    def validate_line(self, line_number: int, line: str):
+        """
+        :return: the document contained in the line
+        """
+        try:
+            document = decode_document(line)
+        except Exception:
+            raise ValidationException(status=HTTPStatus.BAD_REQUEST,
+                                      message=ERR_INVALID_DOCUMENT_FORMAT.format(line_number))
+
+        self.validate_document(line_number, document)
+
+        return document
+
+    def validate_lines(self, lines):
+        """
+        Validates the lines as they are read, so the rest of the lines are not read after the first invalid one
+        """
+        for line_number, line in enumerate(lines, 1):
+            self.validate_line(line_number, line)
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: helpers shared by the benchmarks of the language analysis scripts
+
+import importlib.util
+import os
+import random
+import sys
+import time
+
+import spacy
+
+from spacy.language import Language
+
+ANALYSIS_SCRIPTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     'assets', 'data_source_analysis')
+SHARED_MODULES_PATH = os.path.join(ANALYSIS_SCRIPTS_PATH, 'shared')
+LAYER_MODULES_PATH = os.path.join(os.path.dirname(ANALYSIS_SCRIPTS_PATH), 'system_lambda_layer', 'python')
+
+VOCABULARY = ['the', 'of', 'and', 'to', 'in', 'is', 'was', 'for', 'that', 'with', 'on', 'as', 'by', 'at', 'from',
+              'government', 'people', 'year', 'week', 'city', 'country', 'market', 'company', 'report', 'minister',
+              'said', 'announced', 'increased', 'decided', 'published', 'expects', 'runs', 'grows', 'plays',
+              'new', 'large', 'small', 'important', 'economic', 'local', 'international', 'recent', 'strong',
+              'quickly', 'recently', 'very', 'also', 'however', 'still', 'already', 'probably', 'again',
+              'weekend', 'marketing', 'software', 'streaming', 'startup', 'feedback', 'online', 'ranking']
+
+# Part of speech of the words of the vocabulary assigned by the offline pipeline. Other words are tagged as X
+POS_TAGS = {
+    **dict.fromkeys(['government', 'people', 'year', 'week', 'city', 'country', 'market', 'company', 'report',
+                     'minister', 'weekend', 'marketing', 'software', 'streaming', 'startup', 'feedback', 'ranking'],
+                    'NOUN'),
+    **dict.fromkeys(['said', 'announced', 'increased', 'decided', 'published', 'expects', 'runs', 'grows', 'plays'],
+                    'VERB'),
+    **dict.fromkeys(['new', 'large', 'small', 'important', 'economic', 'local', 'international', 'recent', 'strong',
+                     'online'], 'ADJ'),
+    **dict.fromkeys(['quickly', 'recently', 'very', 'also', 'however', 'still', 'already', 'probably', 'again'],
+                    'ADV')
+}
+
+
+@Language.component('benchmark_tagger')
+def benchmark_tagger(doc):
+    """
+    Pipeline component that sets the attributes read by the metrics analysis with a lookup, so benchmarks run without
+    downloading any model
+    """
+    for token in doc:
+        token.pos_ = POS_TAGS.get(token.lower_, 'X')
+        token.lemma_ = token.lower_
+
+    return doc
+
+
+def load_analysis_script(name: str):
+    """
+    Imports the index.py script of one of the batch analysis containers
+    :param name: name of the folder of the analysis (metrics or errors)
+    :return: the imported module
+    """
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+    path = os.path.join(ANALYSIS_SCRIPTS_PATH, name)
+
+    # The scripts import modules that live next to them and modules shared by the containers, copied next to them in
+    # the images
+    for modules_path in [SHARED_MODULES_PATH, path]:
+        if modules_path not in sys.path:
+            sys.path.insert(0, modules_path)
+
+    # The package of the Lambda layer is also copied to the images. Its folder is searched last, so the dependencies
+    # bundled with the layer do not replace the installed ones
+    if LAYER_MODULES_PATH not in sys.path:
+        sys.path.append(LAYER_MODULES_PATH)
+
+    spec = importlib.util.spec_from_file_location('{}_index'.format(name), os.path.join(path, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def synthetic_text(words: int, rand: random.Random) -> str:
+    sentences = []
+
+    while words > 0:
+        length = min(words, rand.randint(6, 20))
+        sentence = ' '.join(rand.choice(VOCABULARY) for _ in range(length))
+        sentences.append(sentence.capitalize() + rand.choice(['.', '.', '.', '!', '?']))
+        words -= length
+
+    return ' '.join(sentences)
+
+
+def synthetic_documents(count: int, words: int, seed: int = 0) -> [dict]:
+    """
+    Generates documents with the same fields as the ones stored in the indexed data sources bucket
+    :param count: number of documents to generate
+    :param words: number of words of the text of each document
+    :param seed: seed of the random generator, so that runs are reproducible
+    :return: list of documents
+    """
+    rand = random.Random(seed)
+
+    return [{
+        'id': str(i),
+        'text': synthetic_text(words, rand),
+        'country': 'Spain',
+        'country-code': 'ES',
+        'date': '2022-06-16',
+        'source': 'benchmark'
+    } for i in range(count)]
+
+
+def offline_pipeline(language: str = 'en'):
+    """
+    Builds a blank spaCy pipeline for the language with a lookup tagger, which runs offline and without GPU
+    """
+    nlp = spacy.blank(language)
+    nlp.add_pipe('benchmark_tagger')
+
+    return nlp
+
+
+def measure(function, *args, **kwargs):
+    """
+    Runs a function and measures its wall-clock time
+    :return: tuple with the value returned by the function and the elapsed seconds
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: measures the lines per second validated by the document validator of the Lambda layer compared with the
+# previous validation, based on datetime.strptime, after checking that both give the same errors
+# Usage: python -m benchmarks.document_validation [--lines N] [--words N] [--repeat N]
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+
+from http import HTTPStatus
+
+from benchmarks import common
+
+sys.path.insert(0, os.path.join(os.path.dirname(common.ANALYSIS_SCRIPTS_PATH), 'system_lambda_layer', 'python'))
+
+from language_analysis import constants
+from language_analysis.utils import validation
+
+
+def reference_validate_line(line_number: int, line: str):
+    """
+    Validation of a line as it was done before the document validator
+    """
+    try:
+        document = json.loads(line)
+    except Exception:
+        raise validation.ValidationException(status=HTTPStatus.BAD_REQUEST,
+                                             message=validation.ERR_INVALID_DOCUMENT_FORMAT.format(line_number))
+
+    for field in constants.REQUIRED_DOCUMENT_FIELDS:
+        if field not in document:
+            raise validation.ValidationException(status=HTTPStatus.BAD_REQUEST,
+                                                 message=validation.ERR_MISSING_DOCUMENT_FIELD.format(line_number,
+                                                                                                     field))
+
+        if type(document[field]) != str:
+            raise validation.ValidationException(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                                 message=validation.ERR_INVALID_DOCUMENT_FIELD_TYPE.
+                                                 format(line_number, field, document[field].__class__.__name__))
+
+        if not document[field]:
+            raise validation.ValidationException(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                                 message=validation.ERR_EMPTY_DOCUMENT_FIELD.format(line_number,
+                                                                                                   field))
+
+    try:
+        datetime.datetime.strptime(document[constants.DOCUMENT_FIELD_DATE], constants.DOCUMENT_FIELD_DATE_FORMAT)
+    except ValueError:
+        raise validation.ValidationException(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                             message=validation.ERR_INVALID_DOCUMENT_DATE_FIELD_FORMAT.
+                                             format(line_number, constants.DOCUMENT_FIELD_DATE,
+                                                    constants.DOCUMENT_FIELD_DATE_FORMAT))
+
+
+# Values of the date field of the documents used to check that both validations give the same errors
+DATES = ['2022-06-16', '2022-6-1', '2022-02-29', '2024-02-29', '1900-02-29', '2000-02-29', '0000-01-01',
+         '2022-13-01', '2022-00-10', '2022-04-31', '2022-12-31 ', ' 2022-12-31', '2022-1- 5', '2022-01-5x', '22-01-01',
+         '2022/01/01', '२०२२-०१-०१', '2022-011-01', '2022-1-111', '']
+
+
+def edge_case_lines(rand: random.Random, count: int) -> [str]:
+    documents = common.synthetic_documents(count, 5)
+    lines = []
+
+    for document in documents:
+        document = {key: document[key] for key in constants.REQUIRED_DOCUMENT_FIELDS}
+        case = rand.randint(0, 9)
+
+        if case < 5:
+            document['date'] = rand.choice(DATES)
+        elif case == 5:
+            del document[rand.choice(constants.REQUIRED_DOCUMENT_FIELDS)]
+        elif case == 6:
+            document[rand.choice(constants.REQUIRED_DOCUMENT_FIELDS)] = rand.choice([1, None, [], ''])
+        elif case == 7:
+            lines.append(rand.choice(['', 'not json', '[]', '{"text": NaN}', json.dumps(document)[:-1]]))
+            continue
+
+        lines.append(json.dumps(document))
+
+    return lines
+
+
+def outcome(function, line_number: int, line: str):
+    try:
+        function(line_number, line)
+    except validation.ValidationException as e:
+        return str(e), e.status
+
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lines per second validated by the document validator')
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=100, help='words of the text of each document')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of each case, the fastest one is reported')
+    args = parser.parse_args()
+
+    validator = validation.DocumentValidator()
+
+    # Both validations must give the same error for each line
+    for line_number, line in enumerate(edge_case_lines(random.Random(0), 5000), 1):
+        expected = outcome(reference_validate_line, line_number, line)
+        found = outcome(validator.validate_line, line_number, line)
+
+        if expected != found:
+            sys.exit('Different results for line {!r}: {} != {}'.format(line, expected, found))
+
+    lines = [json.dumps(document) for document in common.synthetic_documents(args.lines, args.words)]
+    cases = {
+        'strptime': lambda: [reference_validate_line(i, line) for i, line in enumerate(lines, 1)],
+        'document validator': lambda: validator.validate_lines(lines)
+    }
+
+    print('JSON decoder of the validator: {}'.format('orjson' if validation.orjson else 'json'))
+    print('{:<20} {:>14} {:>10}'.format('case', 'lines/sec', 'speedup'))
+    baseline = None
+
+    for name, function in cases.items():
+        rate = args.lines / min(common.measure(function)[1] for _ in range(args.repeat))
+        baseline = baseline or rate
+        print('{:<20} {:>14.1f} {:>9.2f}x'.format(name, rate, rate / baseline))
+
+
+if __name__ == '__main__':
+    main()
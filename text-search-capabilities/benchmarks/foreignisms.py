@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: compares the Aho-Corasick foreignism matcher with the previous per-foreignism substring scan
+# Usage: python -m benchmarks.foreignisms [--documents N] [--list-sizes N ...] [--words N ...]
+
+import argparse
+import os
+import random
+
+from benchmarks import common
+
+FOREIGNISMS_FILE = os.path.join(os.path.dirname(common.ANALYSIS_SCRIPTS_PATH), 'system_config_files',
+                                'foreignisms.txt')
+
+
+def substring_scan(processed_text: str, foreignisms: [str]) -> [str]:
+    """
+    Implementation of the search that the matcher replaced, used as reference
+    """
+    found_foreignisms = []
+
+    for word in foreignisms:
+        if word in processed_text:
+            found_foreignisms.extend([word.strip() for _ in range(processed_text.count(word))])
+
+    return found_foreignisms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Foreignism search speed as the list and documents grow')
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--list-sizes', type=int, nargs='*', default=[100, 1000, 0],
+                        help='number of foreignisms to search for, 0 means the whole list')
+    parser.add_argument('--words', type=int, nargs='*', default=[50, 500, 5000])
+    args = parser.parse_args()
+
+    metrics = common.load_analysis_script('metrics')
+    translation_table = metrics.build_translation_table()
+
+    with open(FOREIGNISMS_FILE) as fd:
+        all_foreignisms = [' {} '.format(word.strip()) for word in fd.read().split('\n')]
+
+    print('{:>9} {:>7} {:>11} {:>14} {:>17} {:>9}'.format('list size', 'words', 'build (ms)', 'scan (ms/doc)',
+                                                          'matcher (ms/doc)', 'speedup'))
+
+    for list_size in args.list_sizes:
+        foreignisms = random.Random(0).sample(all_foreignisms, list_size) if list_size else all_foreignisms
+        matcher, build = common.measure(metrics.ForeignismMatcher, foreignisms)
+
+        for words in args.words:
+            documents = common.synthetic_documents(args.documents, words)
+            texts = [' {} '.format(document['text'].lower().translate(translation_table)) for document in documents]
+
+            expected, scan = common.measure(lambda: [substring_scan(text, foreignisms) for text in texts])
+            found, match = common.measure(lambda: [matcher.find(text) for text in texts])
+
+            if found != expected:
+                raise AssertionError('The matcher and the substring scan found different foreignisms')
+
+            print('{:>9} {:>7} {:>11.2f} {:>14.3f} {:>17.3f} {:>8.1f}x'.format(
+                len(foreignisms), words, build * 1000, scan * 1000 / len(texts), match * 1000 / len(texts),
+                scan / match))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: measures the throughput of the errors analysis with each profile of rules, and its speedup over checking
+# all the rules. Needs Java, and downloads LanguageTool the first time it runs
+# Usage: python -m benchmarks.languagetool_profiles [--profiles NAME ...] [--documents N] [--words N] [--repeat N]
+#        [--language CODE]
+
+import argparse
+
+from benchmarks import common
+
+
+def main():
+    errors = common.load_analysis_script('errors')
+
+    parser = argparse.ArgumentParser(description='Throughput of the errors analysis with each profile of rules')
+    parser.add_argument('--profiles', nargs='*', default=list(errors.ERRORS_PROFILES),
+                        choices=list(errors.ERRORS_PROFILES))
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--words', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of each profile, the fastest one is reported')
+    parser.add_argument('--language', default='en-US')
+    args = parser.parse_args()
+
+    documents = common.synthetic_documents(args.documents, args.words)
+    checker = errors.langtool.LanguageTool(args.language)
+
+    # The first checks of a server are much slower
+    list(errors.analyse_documents(checker, documents[:20]))
+
+    print('{:<20} {:>12} {:>10} {:>10}'.format('profile', 'docs/sec', 'speedup', 'errors'))
+    baseline = None
+
+    try:
+        for profile in args.profiles:
+            errors.apply_profile(checker, profile)
+
+            runs = [common.measure(lambda: list(errors.analyse_documents(checker, documents)))
+                    for _ in range(args.repeat)]
+            found, elapsed = min(runs, key=lambda run: run[1])
+
+            rate = args.documents / elapsed
+            baseline = baseline or rate
+            print('{:<20} {:>12.1f} {:>9.2f}x {:>10}'.format(profile, rate, rate / baseline, len(found)))
+    finally:
+        checker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: measures the throughput of the errors analysis for each number of LanguageTool servers and of vCPUs
+# available to them. Needs Java, and downloads LanguageTool the first time it runs
+# Usage: python -m benchmarks.languagetool_servers [--servers N ...] [--vcpus N ...] [--documents N] [--words N]
+#        [--language CODE]
+
+import argparse
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import common
+
+
+def run_case(servers: int, vcpus: int, documents_count: int, words: int, language: str) -> float:
+    """
+    Runs one case of the benchmark in a process of its own, restricted to the first vCPUs of the machine. The
+    LanguageTool servers are started after restricting the process, so they inherit the restriction
+    :return: documents analysed per second
+    """
+    os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:vcpus])
+
+    errors = common.load_analysis_script('errors')
+    documents = common.synthetic_documents(documents_count, words)
+    checker = errors.start_language_tool_pool(language, servers)
+
+    try:
+        # Warm up the servers, the first checks of each of them are much slower
+        list(errors.analyse_documents(checker, documents[:servers * 4]))
+
+        _, elapsed = common.measure(lambda: list(errors.analyse_documents(checker, documents, max_pending=servers * 2)))
+    finally:
+        checker.close()
+
+    return documents_count / elapsed
+
+
+def main():
+    available = len(os.sched_getaffinity(0))
+
+    parser = argparse.ArgumentParser(description='Throughput of the errors analysis for each number of LanguageTool '
+                                                 'servers and of vCPUs')
+    parser.add_argument('--servers', type=int, nargs='*', default=[1, 2, 4, 8])
+    parser.add_argument('--vcpus', type=int, nargs='*', default=[1, 2, 4, 8])
+    parser.add_argument('--documents', type=int, default=400)
+    parser.add_argument('--words', type=int, default=200)
+    parser.add_argument('--language', default='en-US')
+    args = parser.parse_args()
+
+    vcpus_options = [vcpus for vcpus in args.vcpus if vcpus <= available]
+    context = multiprocessing.get_context('spawn')
+
+    print('{:>8} {:>8} {:>12} {:>10}'.format('vCPUs', 'servers', 'docs/sec', 'speedup'))
+
+    for vcpus in vcpus_options:
+        baseline = None
+
+        for servers in args.servers:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                rate = executor.submit(run_case, servers, vcpus, args.documents, args.words, args.language).result()
+
+            baseline = baseline or rate
+            print('{:>8} {:>8} {:>12.1f} {:>9.2f}x'.format(vcpus, servers, rate, rate / baseline))
+
+    skipped = [vcpus for vcpus in args.vcpus if vcpus > available]
+
+    if skipped:
+        print('Skipped {} vCPUs, only {} are available'.format(', '.join(map(str, skipped)), available))
+
+
+if __name__ == '__main__':
+    main()
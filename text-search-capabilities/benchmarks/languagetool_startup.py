@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: measures the time from starting a LanguageTool server to receiving the results of its first check, when
+# LanguageTool is downloaded on first use (as before it was installed in the errors image), when it is already
+# installed, and when its server uses a class data sharing archive. Needs Java
+# Usage: python -m benchmarks.languagetool_startup [--repeat N] [--language CODE] [--ltp-path DIR] [--archive FILE]
+#        [--jvm-options OPTIONS] [--download]
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import common
+
+TEXT = 'This are a example sentence , with some errors.'
+
+
+def time_to_first_check(language: str, ltp_path: str, options: str, archive: str) -> float:
+    """
+    Starts a LanguageTool server and checks a text. It is executed in a process of its own, so nothing is reused from
+    previous runs
+    :return: seconds until the results of the check are received
+    """
+    os.environ['LTP_PATH'] = ltp_path
+    os.environ.pop('JAVA_TOOL_OPTIONS', None)
+
+    errors = common.load_analysis_script('errors')
+    errors.configure_jvm(options, archive)
+
+    def start_and_check():
+        checker = errors.langtool.LanguageTool(language)
+        checker.check(TEXT)
+        return checker
+
+    checker, elapsed = common.measure(start_and_check)
+    checker.close()
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to the first check of a LanguageTool server')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--language', default='en-US')
+    parser.add_argument('--ltp-path', default=os.environ.get('LTP_PATH',
+                                                             os.path.expanduser('~/.cache/language_tool_python')),
+                        help='folder where LanguageTool is installed')
+    parser.add_argument('--archive', default=os.environ.get('LANGUAGETOOL_CDS_ARCHIVE'),
+                        help='class data sharing archive, as created by errors/languagetool_setup.py')
+    parser.add_argument('--jvm-options', default='', help='JVM options of every case, e.g. -Xmx1024m')
+    parser.add_argument('--download', action='store_true',
+                        help='also measure downloading LanguageTool on first use, as jobs did before it was installed in '
+                             'the image')
+    args = parser.parse_args()
+
+    cases = []
+
+    if args.download:
+        cases.append(('download on first use', None, None))
+
+    cases.append(('installed', args.ltp_path, None))
+
+    if args.archive and os.path.isfile(args.archive):
+        cases.append(('installed + CDS archive', args.ltp_path, args.archive))
+    else:
+        print('No class data sharing archive, skipping its case')
+
+    context = multiprocessing.get_context('spawn')
+
+    print('{:<28} {:>10} {:>10} {:>10}'.format('case', 'min (s)', 'median (s)', 'max (s)'))
+
+    for name, ltp_path, archive in cases:
+        times = []
+
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as download_path, \
+                    ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                times.append(executor.submit(time_to_first_check, args.language, ltp_path or download_path,
+                                             args.jvm_options, archive).result())
+
+        print('{:<28} {:>10.2f} {:>10.2f} {:>10.2f}'.format(name, min(times), statistics.median(times), max(times)))
+
+
+if __name__ == '__main__':
+    main()
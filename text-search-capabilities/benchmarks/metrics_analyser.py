@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: measures the throughput and memory of the metrics analysis on synthetic corpora with an offline spaCy
+# pipeline, and compares the results with a baseline to detect regressions
+# Usage: python -m benchmarks.metrics_analyser [--documents N] [--words N ...] [--repeat N] [--baseline FILE]
+#        [--update-baseline] [--threshold FRACTION]
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+
+import spacy
+
+from benchmarks import common
+
+CASES = ['analyse_document_text', 'find_foreignisms_in_text', 'analyse_documents']
+
+FOREIGNISMS_FILE = os.path.join(os.path.dirname(common.ANALYSIS_SCRIPTS_PATH), 'system_config_files',
+                                'foreignisms.txt')
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes and macOS bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(case: str, documents_count: int, words: int, repeat: int) -> dict:
+    """
+    Runs one case of the benchmark. It is executed in a process of its own so that the peak memory is the one of the
+    case
+    :return: dictionary with the documents and tokens analysed per second in the fastest repetition, and the peak RSS
+    """
+    metrics = common.load_analysis_script('metrics')
+    translation_table = metrics.build_translation_table()
+
+    with open(FOREIGNISMS_FILE) as fd:
+        matcher = metrics.ForeignismMatcher([' {} '.format(word.strip()) for word in fd.read().split('\n')])
+
+    nlp = common.offline_pipeline()
+    documents = common.synthetic_documents(documents_count, words)
+    texts = [document['text'] for document in documents]
+    parsed = list(nlp.pipe(texts))
+    tokens = sum(len(doc) for doc in parsed)
+
+    if case == 'analyse_document_text':
+        def function():
+            return [metrics.analyse_document_text(doc, matcher, translation_table) for doc in parsed]
+    elif case == 'find_foreignisms_in_text':
+        def function():
+            return [metrics.find_foreignisms_in_text(text, translation_table, matcher) for text in texts]
+    else:
+        def function():
+            return list(metrics.analyse_documents(nlp, matcher, translation_table, documents,
+                                                  metrics.SPACY_BATCH_SIZE, 1))
+
+    elapsed = min(common.measure(function)[1] for _ in range(repeat))
+
+    return {
+        'docs_per_sec': documents_count / elapsed,
+        'tokens_per_sec': tokens / elapsed,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def run(cases: [str], documents_count: int, words: [int], repeat: int) -> dict:
+    results = {}
+    context = multiprocessing.get_context('spawn')
+
+    for case in cases:
+        for length in words:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results['{}/{}x{}'.format(case, documents_count, length)] = \
+                    executor.submit(run_case, case, documents_count, length, repeat).result()
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> [str]:
+    """
+    :param threshold: fraction by which a result can be worse than the baseline before it is a regression
+    :return: list with the description of the regressions
+    """
+    regressions = []
+
+    for name, result in results.items():
+        expected = baseline.get(name)
+
+        if expected is None:
+            continue
+
+        for metric in ['docs_per_sec', 'tokens_per_sec']:
+            if result[metric] < expected[metric] * (1 - threshold):
+                regressions.append('{} {}: {:.1f} < {:.1f}'.format(name, metric, result[metric], expected[metric]))
+
+        if result['peak_rss_mb'] > expected['peak_rss_mb'] * (1 + threshold):
+            regressions.append('{} peak_rss_mb: {:.1f} > {:.1f}'.format(name, result['peak_rss_mb'],
+                                                                       expected['peak_rss_mb']))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput and peak memory of the metrics analysis')
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--words', type=int, nargs='*', default=[50, 500, 2000])
+    parser.add_argument('--cases', nargs='*', default=CASES, choices=CASES)
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of each case, the fastest one is reported')
+    parser.add_argument('--baseline', help='JSON file with the results to compare with. Created if it does not exist')
+    parser.add_argument('--update-baseline', action='store_true', help='overwrite the baseline with the results')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fraction by which a result can be worse than the baseline (default 0.2)')
+    args = parser.parse_args()
+
+    results = run(args.cases, args.documents, args.words, args.repeat)
+
+    print('{:<45} {:>12} {:>14} {:>14}'.format('case', 'docs/sec', 'tokens/sec', 'peak RSS (MB)'))
+
+    for name, result in results.items():
+        print('{:<45} {:>12.1f} {:>14.1f} {:>14.1f}'.format(name, result['docs_per_sec'], result['tokens_per_sec'],
+                                                             result['peak_rss_mb']))
+
+    if not args.baseline:
+        return
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as fd:
+            json.dump({
+                'environment': {
+                    'python': platform.python_version(),
+                    'spacy': spacy.__version__,
+                    'machine': platform.machine()
+                },
+                'results': results
+            }, fd, indent=2)
+
+        print('Baseline written to {}'.format(args.baseline))
+        return
+
+    with open(args.baseline) as fd:
+        regressions = compare(results, json.load(fd)['results'], args.threshold)
+
+    if regressions:
+        print('Regressions beyond {:.0%} of the baseline:'.format(args.threshold))
+        print('\n'.join('  ' + regression for regression in regressions))
+        sys.exit(1)
+
+    print('No regressions beyond {:.0%} of the baseline'.format(args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: measures the documents per second indexed by the bulk helpers of the Lambda layer for each number of bulk
+# requests sent at the same time, against a local stand-in of the bulk endpoint of the OpenSearch domain that answers
+# each request after a fixed latency
+# Usage: python -m benchmarks.opensearch_bulk [--threads N ...] [--documents N] [--words N] [--chunk-size N]
+#        [--latency-ms N] [--repeat N]
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import common
+
+sys.path.insert(0, os.path.join(os.path.dirname(common.ANALYSIS_SCRIPTS_PATH), 'system_lambda_layer', 'python'))
+
+from opensearchpy import OpenSearch
+from language_analysis.utils import opensearch
+
+
+class BulkEndpoint(BaseHTTPRequestHandler):
+    """
+    Answers bulk requests as the domain does when all the actions succeed, after waiting for the latency of the server
+    """
+    latency = 0
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        lines = self.rfile.read(int(self.headers['Content-Length'])).splitlines()
+        items = []
+
+        # Index actions are followed by the document
+        for line in lines[::2]:
+            action = json.loads(line)
+            op_type = next(iter(action))
+            items.append({op_type: {'_id': action[op_type].get('_id'), 'status': 201}})
+
+        time.sleep(self.latency)
+
+        body = json.dumps({'took': 1, 'errors': False, 'items': items}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_PUT = do_POST
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Documents per second indexed for each number of bulk requests '
+                                                 'sent at the same time')
+    parser.add_argument('--threads', type=int, nargs='*', default=[1, 2, 4, 8])
+    parser.add_argument('--documents', type=int, default=10000)
+    parser.add_argument('--words', type=int, default=100, help='words of the text of each document')
+    parser.add_argument('--chunk-size', type=int, default=500, help='documents of each bulk request')
+    parser.add_argument('--latency-ms', type=int, default=100, help='time the endpoint takes to answer a request')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of each case, the fastest one is reported')
+    args = parser.parse_args()
+
+    BulkEndpoint.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BulkEndpoint)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = OpenSearch(hosts=[{'host': '127.0.0.1', 'port': server.server_port}], maxsize=max(args.threads))
+    documents = common.synthetic_documents(args.documents, args.words)
+
+    def index(thread_count: int):
+        actions = ({'_op_type': 'index', '_index': 'documents', '_id': str(i), '_source': document}
+                   for i, document in enumerate(documents))
+        return opensearch.parallel_bulk(client, actions, thread_count=thread_count, chunk_size=args.chunk_size)
+
+    print('{:<10} {:>12} {:>10}'.format('threads', 'docs/sec', 'speedup'))
+    baseline = None
+
+    try:
+        for thread_count in args.threads:
+            runs = [common.measure(lambda: index(thread_count)) for _ in range(args.repeat)]
+            (indexed, failed, _), elapsed = min(runs, key=lambda run: run[1])
+
+            if indexed != args.documents or failed:
+                sys.exit('{} documents indexed and {} failed with {} threads'.format(indexed, failed, thread_count))
+
+            rate = args.documents / elapsed
+            baseline = baseline or rate
+            print('{:<10} {:>12.1f} {:>9.2f}x'.format(thread_count, rate, rate / baseline))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
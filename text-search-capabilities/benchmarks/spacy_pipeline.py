@@ -0,0 +1,49 @@
+#!/usr/bin/python
+# Author: Borja Pérez Guasch <bpguasch@amazon.com>
+# License: Apache 2.0
+# Summary: compares the analysis speed of the full spaCy pipelines with the trimmed ones used by the metrics job
+# Usage: python -m benchmarks.spacy_pipeline [--documents N] [--words N] [--models MODEL ...]
+
+import argparse
+
+import spacy
+
+from benchmarks import common
+
+
+def run(nlp, metrics, documents) -> float:
+    translation_table = metrics.build_translation_table()
+    _, elapsed = common.measure(lambda: list(metrics.analyse_documents(nlp, [], translation_table, documents,
+                                                                       metrics.SPACY_BATCH_SIZE, 1)))
+    return elapsed / len(documents)
+
+
+def main():
+    metrics = common.load_analysis_script('metrics')
+    all_models = sorted({model for modes in metrics.spacy_models.values() for model in modes.values()})
+
+    parser = argparse.ArgumentParser(description='Per-document speedup of the trimmed spaCy pipelines')
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--words', type=int, default=150)
+    parser.add_argument('--models', nargs='*', default=all_models)
+    args = parser.parse_args()
+
+    documents = common.synthetic_documents(args.documents, args.words)
+
+    print('{:<20} {:>14} {:>14} {:>9}  {}'.format('model', 'full (ms/doc)', 'trim (ms/doc)', 'speedup', 'excluded'))
+
+    for name in args.models:
+        if not spacy.util.is_package(name):
+            print('{:<20} not installed'.format(name))
+            continue
+
+        full = run(spacy.load(name), metrics, documents)
+        nlp, excluded = metrics.load_spacy_model(name)
+        trimmed = run(nlp, metrics, documents)
+
+        print('{:<20} {:>14.2f} {:>14.2f} {:>8.2f}x  {}'.format(name, full * 1000, trimmed * 1000, full / trimmed,
+                                                                ', '.join(excluded) or '-'))
+
+
+if __name__ == '__main__':
+    main()
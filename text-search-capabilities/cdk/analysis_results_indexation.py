@@ -43,7 +43,12 @@ class AnalysisResultsIndexationStack(NestedStack):
                                     code=lambda_.Code.from_asset('assets/func_index_analysis_results'),
                                     layers=[layer],
                                     retry_attempts=0,
-                                    memory_size=1024)
+                                    memory_size=1024,
+                                    environment={
+                                        'BULK_CHUNK_SIZE': str(constants.BULK_CHUNK_SIZE),
+                                        'BULK_MAX_CHUNK_BYTES': str(constants.BULK_MAX_CHUNK_BYTES),
+                                        'BULK_THREAD_COUNT': str(constants.BULK_THREAD_COUNT)
+                                    })
 
         function.add_to_role_policy(
             iam.PolicyStatement(actions=['s3:GetObject'],
@@ -51,7 +56,7 @@ class AnalysisResultsIndexationStack(NestedStack):
         )
 
         function.add_to_role_policy(
-            iam.PolicyStatement(actions=['ssm:GetParameter'],
+            iam.PolicyStatement(actions=['ssm:GetParameter', 'ssm:GetParametersByPath'],
                                 resources=['arn:aws:ssm:*:{}:parameter/{}*'.format(self.account,
                                                                                    constants.SSM_PARAMS_PATH)])
         )
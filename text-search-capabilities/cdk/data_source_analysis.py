@@ -12,6 +12,7 @@ from aws_cdk import (
     aws_ssm as ssm,
     aws_cloudtrail as cloudtrail,
     aws_codecommit as codecommit,
+    aws_s3_assets as s3_assets,
     aws_codebuild as codebuild,
     aws_iam as iam,
     aws_ecr as ecr,
@@ -23,6 +24,9 @@ from aws_cdk import (
     aws_events as events,
     aws_events_targets as events_targets,
     aws_lambda as _lambda,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_logs as logs,
+    aws_sqs as sqs,
     CustomResource,
     Stack
 )
@@ -38,14 +42,34 @@ class DataSourceAnalysisStack(NestedStack):
     __COMMAND_GET_LANG = "LANG=$(aws ssm get-parameter --name /language-analysis/language | jq -r '.Parameter.Value')"
     __COMMAND_GET_SPACY_MODE = "SPACY_MODE=$(aws ssm get-parameter --name /language-analysis/spaCyMode | \
 jq -r '.Parameter.Value')"
-    __COMMAND_GET_SPACY_MODEL = 'SPACY_MODEL=$(python3 spacy_model_selector.py $LANG $SPACY_MODE)'
-    __COMMAND_BUILD = 'docker build -t $ECR_REPO_NAME:$IMAGE_TAG --build-arg SPACY_MODEL=$SPACY_MODEL .'
+    # The repositories of the images contain the folders of both analysis jobs, which share some of their modules, and
+    # the package of the Lambda layer, so the commands are formatted with the folder of the job
+    __COMMAND_GET_SPACY_MODEL = \
+        'SPACY_MODEL=$(python3 data_source_analysis/{}/spacy_model_selector.py $LANG $SPACY_MODE)'
+    __COMMAND_BUILD = 'docker build -t $ECR_REPO_NAME:$IMAGE_TAG -f data_source_analysis/{}/Dockerfile \
+--build-arg SPACY_MODEL=$SPACY_MODEL --build-arg LANGUAGE=$LANG --build-arg IMAGE_VERSION=$CODEBUILD_RESOLVED_SOURCE_VERSION .'
+    __ANALYSIS_JOBS_CODE_PATH = 'assets'
+    # Folders of the assets left out of the repositories of the images. Only the package of the Lambda layer is kept
+    # from it, since the jobs install their own dependencies
+    __ANALYSIS_JOBS_CODE_EXCLUDE = ['func_*', 'system_config_files', 'system_lambda_layer/python/*',
+                                    '!system_lambda_layer/python/language_analysis', '**/__pycache__']
+    __METRICS_JOB_VCPUS = 2
+    __ERRORS_JOB_VCPUS = 2
+    __ERRORS_JOB_MEMORY = 4096
+    # Days after which the parts of the multipart uploads left by failed jobs and functions are deleted
+    __INCOMPLETE_MULTIPART_UPLOAD_DAYS = 1
+    # Prefixes of the analysis cache bucket used by each job, and days after which their entries expire
+    __METRICS_CACHE_PREFIX = 'metrics/'
+    __ERRORS_CACHE_PREFIX = 'errors/'
+    __ANALYSIS_CACHE_EXPIRATION_DAYS = 30
 
     def __create_s3_bucket(self) -> s3.Bucket:
         bucket = s3.Bucket(self, 'AnalysisResultsBucket',
                            bucket_name='analysis-results-' + self.node.scope.stack_id_termination,
                            removal_policy=RemovalPolicy.DESTROY,
-                           auto_delete_objects=True)
+                           auto_delete_objects=True,
+                           lifecycle_rules=[s3.LifecycleRule(abort_incomplete_multipart_upload_after=Duration.days(
+                               self.__INCOMPLETE_MULTIPART_UPLOAD_DAYS))])
 
         Tags.of(bucket).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
         Tags.of(bucket).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
@@ -60,6 +84,38 @@ jq -r '.Parameter.Value')"
 
         return bucket
 
+    def __create_analysis_cache_bucket(self) -> s3.Bucket:
+        # Entries expire some days after being cached, instead of being evicted by the jobs
+        bucket = s3.Bucket(self, 'AnalysisCacheBucket',
+                           bucket_name='analysis-cache-' + self.node.scope.stack_id_termination,
+                           removal_policy=RemovalPolicy.DESTROY,
+                           auto_delete_objects=True,
+                           lifecycle_rules=[s3.LifecycleRule(prefix=prefix,
+                                                             expiration=Duration.days(
+                                                                 self.__ANALYSIS_CACHE_EXPIRATION_DAYS))
+                                            for prefix in [self.__METRICS_CACHE_PREFIX, self.__ERRORS_CACHE_PREFIX]])
+
+        Tags.of(bucket).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(bucket).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
+        return bucket
+
+    def __create_partial_results_bucket(self) -> s3.Bucket:
+        # Results of the shards of the analysed files. They are merged into the analysis results bucket, which is the
+        # one watched by the trail, and deleted afterwards. Results left by failed analyses expire
+        bucket = s3.Bucket(self, 'AnalysisPartialResultsBucket',
+                           bucket_name='analysis-partial-results-' + self.node.scope.stack_id_termination,
+                           removal_policy=RemovalPolicy.DESTROY,
+                           auto_delete_objects=True,
+                           lifecycle_rules=[s3.LifecycleRule(expiration=Duration.days(1),
+                                                             abort_incomplete_multipart_upload_after=Duration.days(
+                                                                 self.__INCOMPLETE_MULTIPART_UPLOAD_DAYS))])
+
+        Tags.of(bucket).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(bucket).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
+        return bucket
+
     def __create_s3_object_level_events_trail(self, bucket):
         trail_bucket = s3.Bucket(self, 'AnalysisS3ObjectLevelEventsTrailBucket',
                                  auto_delete_objects=True,
@@ -84,6 +140,12 @@ jq -r '.Parameter.Value')"
         Tags.of(trail).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
         Tags.of(trail).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
 
+    def __create_analysis_jobs_code(self, construct_id: str) -> codecommit.Code:
+        asset = s3_assets.Asset(self, construct_id, path=self.__ANALYSIS_JOBS_CODE_PATH,
+                                exclude=self.__ANALYSIS_JOBS_CODE_EXCLUDE)
+
+        return codecommit.Code.from_asset(asset)
+
     def __create_metrics_dev_tools(self):
         # Retrieve the default buildspec of the module
         buildspec = CodeCommitToECRPipeline.buildspec()
@@ -92,8 +154,8 @@ jq -r '.Parameter.Value')"
         # Add additional commands at the beginning and modify the Docker build command
         build_commands = [self.__COMMAND_GET_LANG,
                           self.__COMMAND_GET_SPACY_MODE,
-                          self.__COMMAND_GET_SPACY_MODEL] + build_commands
-        build_commands[3] = self.__COMMAND_BUILD
+                          self.__COMMAND_GET_SPACY_MODEL.format('metrics')] + build_commands
+        build_commands[3] = self.__COMMAND_BUILD.format('metrics')
 
         # Update the commands of the build phase
         buildspec['phases']['build']['commands'] = build_commands
@@ -105,7 +167,7 @@ jq -r '.Parameter.Value')"
 
             codecommit_repository_props=codecommit.RepositoryProps(
                 repository_name='language-analysis-metrics',
-                code=codecommit.Code.from_directory('assets/data_source_analysis/metrics')),
+                code=self.__create_analysis_jobs_code('MetricsCode')),
 
             codebuild_project_props=codebuild.PipelineProjectProps(
                 build_spec=buildspec
@@ -135,8 +197,8 @@ jq -r '.Parameter.Value')"
         # Add additional commands at the beginning and modify the Docker build command
         build_commands = [self.__COMMAND_GET_LANG,
                           self.__COMMAND_GET_SPACY_MODE,
-                          self.__COMMAND_GET_SPACY_MODEL] + build_commands
-        build_commands[3] = self.__COMMAND_BUILD
+                          self.__COMMAND_GET_SPACY_MODEL.format('errors')] + build_commands
+        build_commands[3] = self.__COMMAND_BUILD.format('errors')
 
         # Update the commands of the build phase
         buildspec['phases']['build']['commands'] = build_commands
@@ -148,7 +210,7 @@ jq -r '.Parameter.Value')"
 
             codecommit_repository_props=codecommit.RepositoryProps(
                 repository_name='language-analysis-errors',
-                code=codecommit.Code.from_directory('assets/data_source_analysis/errors')),
+                code=self.__create_analysis_jobs_code('ErrorsCode')),
 
             codebuild_project_props=codebuild.PipelineProjectProps(
                 build_spec=buildspec
@@ -171,7 +233,8 @@ jq -r '.Parameter.Value')"
         return pipeline
 
     def __create_metrics_aws_batch_components(self, ecr_repository: ecr.Repository, vpc, indexed_data_sources_bucket,
-                                              analysis_results_bucket, config_files_bucket):
+                                              analysis_results_bucket, config_files_bucket, analysis_cache_bucket,
+                                              partial_results_bucket):
         spot_ce = batch.ComputeEnvironment(self, 'MetricsSpotCE',
                                            compute_environment_name='Metrics-Spot-CE',
                                            compute_resources=batch.ComputeResources(
@@ -224,12 +287,30 @@ jq -r '.Parameter.Value')"
                                                     actions=['s3:GetObject', 's3:PutObject'],
                                                     resources=[indexed_data_sources_bucket.bucket_arn + '/*',
                                                                analysis_results_bucket.bucket_arn + '/*',
-                                                               config_files_bucket.bucket_arn + '/*'])
+                                                               config_files_bucket.bucket_arn + '/*']),
+                                # Results are uploaded in the parts of a multipart upload, aborted if the job fails
+                                iam.PolicyStatement(effect=iam.Effect.ALLOW,
+                                                    actions=['s3:AbortMultipartUpload'],
+                                                    resources=[analysis_results_bucket.bucket_arn + '/*'])
                                 ]),
                             'SSMGet': iam.PolicyDocument(statements=[
                                 iam.PolicyStatement(effect=iam.Effect.ALLOW,
-                                                    actions=['ssm:GetParameter'],
+                                                    actions=['ssm:GetParameter', 'ssm:GetParametersByPath'],
                                                     resources=['arn:aws:ssm:*:{}:parameter/{}*'.format(self.account, constants.SSM_PARAMS_PATH)])
+                            ]),
+                            'AnalysisCache': iam.PolicyDocument(statements=[
+                                iam.PolicyStatement(effect=iam.Effect.ALLOW,
+                                                    actions=['s3:GetObject', 's3:PutObject'],
+                                                    resources=[analysis_cache_bucket.bucket_arn + '/*']),
+                                # Lookups of entries that are not cached fail with NoSuchKey instead of AccessDenied
+                                iam.PolicyStatement(effect=iam.Effect.ALLOW,
+                                                    actions=['s3:ListBucket'],
+                                                    resources=[analysis_cache_bucket.bucket_arn])
+                            ]),
+                            'PartialResults': iam.PolicyDocument(statements=[
+                                iam.PolicyStatement(effect=iam.Effect.ALLOW,
+                                                    actions=['s3:PutObject', 's3:AbortMultipartUpload'],
+                                                    resources=[partial_results_bucket.bucket_arn + '/*'])
                             ])
                         })
 
@@ -240,14 +321,23 @@ jq -r '.Parameter.Value')"
                                          job_definition_name='Metrics-Job-Definition',
                                          retry_attempts=1,
                                          container=batch.JobDefinitionContainer(
-                                             environment={'AWS_REGION': NestedStack.of(self).region},
-                                             vcpus=2,
+                                             environment={'AWS_REGION': NestedStack.of(self).region,
+                                                          'SPACY_N_PROCESS': str(self.__METRICS_JOB_VCPUS),
+                                                          'ANALYSIS_CACHE': 's3://{}/{}'.format(
+                                                              analysis_cache_bucket.bucket_name,
+                                                              self.__METRICS_CACHE_PREFIX),
+                                                          'ANALYSIS_SHARDS': str(constants.ANALYSIS_SHARDS),
+                                                          'PARTIAL_RESULTS_BUCKET': partial_results_bucket.bucket_name},
+                                             vcpus=self.__METRICS_JOB_VCPUS,
                                              memory_limit_mib=4096,
                                              execution_role=role,
                                              job_role=role,
                                              image=ecs.EcrImage(ecr_repository, "latest"),
                                              command=['Ref::indexed_data_sources_bucket',
-                                                      'Ref::key']
+                                                      '--manifest',
+                                                      'Ref::manifest',
+                                                      '--run-id',
+                                                      'Ref::run_id']
                                          ))
 
         Tags.of(definition).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
@@ -256,7 +346,7 @@ jq -r '.Parameter.Value')"
         return queue, definition
 
     def __create_errors_aws_batch_components(self, ecr_repository: ecr.Repository, vpc, indexed_data_sources_bucket,
-                                             analysis_results_bucket):
+                                             analysis_results_bucket, analysis_cache_bucket, partial_results_bucket):
         spot_ce = batch.ComputeEnvironment(self, 'ErrorsSpotCE',
                                            compute_environment_name='Errors-Spot-CE',
                                            compute_resources=batch.ComputeResources(
@@ -308,30 +398,61 @@ jq -r '.Parameter.Value')"
                                 iam.PolicyStatement(effect=iam.Effect.ALLOW,
                                                     actions=['s3:GetObject', 's3:PutObject'],
                                                     resources=[indexed_data_sources_bucket.bucket_arn + '/*',
-                                                               analysis_results_bucket.bucket_arn + '/*'])
+                                                               analysis_results_bucket.bucket_arn + '/*']),
+                                # Results are uploaded in the parts of a multipart upload, aborted if the job fails
+                                iam.PolicyStatement(effect=iam.Effect.ALLOW,
+                                                    actions=['s3:AbortMultipartUpload'],
+                                                    resources=[analysis_results_bucket.bucket_arn + '/*'])
                                 ]),
                             'SSMGet': iam.PolicyDocument(statements=[
                                 iam.PolicyStatement(effect=iam.Effect.ALLOW,
-                                                    actions=['ssm:GetParameter'],
+                                                    actions=['ssm:GetParameter', 'ssm:GetParametersByPath'],
                                                     resources=['arn:aws:ssm:*:{}:parameter/{}*'.format(self.account, constants.SSM_PARAMS_PATH)])
+                            ]),
+                            'AnalysisCache': iam.PolicyDocument(statements=[
+                                iam.PolicyStatement(effect=iam.Effect.ALLOW,
+                                                    actions=['s3:GetObject', 's3:PutObject'],
+                                                    resources=[analysis_cache_bucket.bucket_arn + '/*']),
+                                # Lookups of entries that are not cached fail with NoSuchKey instead of AccessDenied
+                                iam.PolicyStatement(effect=iam.Effect.ALLOW,
+                                                    actions=['s3:ListBucket'],
+                                                    resources=[analysis_cache_bucket.bucket_arn])
+                            ]),
+                            'PartialResults': iam.PolicyDocument(statements=[
+                                iam.PolicyStatement(effect=iam.Effect.ALLOW,
+                                                    actions=['s3:PutObject', 's3:AbortMultipartUpload'],
+                                                    resources=[partial_results_bucket.bucket_arn + '/*'])
                             ])
                         })
 
         Tags.of(role).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
         Tags.of(role).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
 
+        # The heap of each LanguageTool server is half of its share of the memory of the job, leaving the rest to the
+        # JVM and the job
         definition = batch.JobDefinition(self, 'ErrorsJobDefinition',
                                          job_definition_name='Errors-Job-Definition',
                                          retry_attempts=1,
                                          container=batch.JobDefinitionContainer(
-                                             environment={'AWS_REGION': NestedStack.of(self).region},
-                                             vcpus=2,
-                                             memory_limit_mib=4096,
+                                             environment={'AWS_REGION': NestedStack.of(self).region,
+                                                          'ANALYSIS_CACHE': 's3://{}/{}'.format(
+                                                              analysis_cache_bucket.bucket_name,
+                                                              self.__ERRORS_CACHE_PREFIX),
+                                                          'ANALYSIS_SHARDS': str(constants.ANALYSIS_SHARDS),
+                                                          'LANGUAGETOOL_SERVERS': str(self.__ERRORS_JOB_VCPUS),
+                                                          'LANGUAGETOOL_JVM_OPTIONS': '-Xmx{}m'.format(
+                                                              self.__ERRORS_JOB_MEMORY // self.__ERRORS_JOB_VCPUS // 2),
+                                                          'PARTIAL_RESULTS_BUCKET': partial_results_bucket.bucket_name},
+                                             vcpus=self.__ERRORS_JOB_VCPUS,
+                                             memory_limit_mib=self.__ERRORS_JOB_MEMORY,
                                              execution_role=role,
                                              job_role=role,
                                              image=ecs.EcrImage(ecr_repository, "latest"),
                                              command=['Ref::indexed_data_sources_bucket',
-                                                      'Ref::key']
+                                                      '--manifest',
+                                                      'Ref::manifest',
+                                                      '--run-id',
+                                                      'Ref::run_id']
                                          ))
 
         Tags.of(definition).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
@@ -339,39 +460,124 @@ jq -r '.Parameter.Value')"
 
         return queue, definition
 
+    def __create_merge_analysis_results_lambda(self, partial_results_bucket, analysis_results_bucket):
+        # Create the log group so that it's cleaned when deleting the stack
+        log_group = logs.LogGroup(self, 'MergeAnalysisResultsFunctionLogGroup',
+                                  log_group_name='/aws/lambda/mergeAnalysisResults',
+                                  removal_policy=RemovalPolicy.DESTROY,
+                                  retention=logs.RetentionDays.SIX_MONTHS)
+
+        Tags.of(log_group).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(log_group).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
+        function = _lambda.Function(self, 'MergeAnalysisResultsFunction',
+                                    function_name='mergeAnalysisResults',
+                                    handler='index.handler',
+                                    runtime=_lambda.Runtime.PYTHON_3_9,
+                                    timeout=Duration.minutes(15),
+                                    code=_lambda.Code.from_asset('assets/func_merge_analysis_results'),
+                                    layers=[self.node.scope.global_resources_stack.layer],
+                                    retry_attempts=0,
+                                    memory_size=1024,
+                                    environment={
+                                        'PARTIAL_RESULTS_BUCKET': partial_results_bucket.bucket_name
+                                    })
+
+        function.add_to_role_policy(
+            iam.PolicyStatement(actions=['s3:GetObject', 's3:DeleteObject'],
+                                resources=[partial_results_bucket.bucket_arn + '/*'])
+        )
+
+        function.add_to_role_policy(
+            iam.PolicyStatement(actions=['s3:ListBucket'],
+                                resources=[partial_results_bucket.bucket_arn])
+        )
+
+        function.add_to_role_policy(
+            iam.PolicyStatement(actions=['s3:PutObject', 's3:AbortMultipartUpload'],
+                                resources=[analysis_results_bucket.bucket_arn + '/*'])
+        )
+
+        function.add_to_role_policy(
+            iam.PolicyStatement(actions=['ssm:GetParameter', 'ssm:GetParametersByPath'],
+                                resources=['arn:aws:ssm:*:{}:parameter/{}*'.format(self.account,
+                                                                                   constants.SSM_PARAMS_PATH)])
+        )
+
+        function.node.add_dependency(log_group)
+
+        Tags.of(function).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(function).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
+        return function
+
+    def __create_submit_analysis_job_task(self, construct_id: str, job_name: str, job_queue, job_definition,
+                                          array_size: int = None) -> step_functions_tasks.BatchSubmitJob:
+        # The execution name identifies the results of the shards of this analysis
+        return step_functions_tasks.BatchSubmitJob(self, construct_id,
+                                                   job_name=job_name,
+                                                   job_queue_arn=job_queue.job_queue_arn,
+                                                   job_definition_arn=job_definition.job_definition_arn,
+                                                   array_size=array_size,
+                                                   payload=step_functions.TaskInput.from_object(
+                                                       {
+                                                           "indexed_data_sources_bucket": step_functions.JsonPath.string_at(
+                                                               "$.bucket"),
+                                                           "manifest": step_functions.JsonPath.json_to_string(
+                                                               step_functions.JsonPath.list_at("$.keys")),
+                                                           "run_id": step_functions.JsonPath.string_at(
+                                                               "$$.Execution.Name")
+                                                       }
+                                                   ))
+
     def __create_state_machine(self, metrics_job_queue, metrics_job_definition,
-                               errors_job_queue, errors_job_definition):
-        submit_metrics_job = step_functions_tasks.BatchSubmitJob(self, 'Submit metrics calculation job',
-                                                                 job_name='MetricsCalculation',
-                                                                 job_queue_arn=metrics_job_queue.job_queue_arn,
-                                                                 job_definition_arn=metrics_job_definition.job_definition_arn,
-                                                                 payload=step_functions.TaskInput.from_object(
-                                                                     {
-                                                                         "indexed_data_sources_bucket": step_functions.JsonPath.string_at("$.detail.requestParameters.bucketName"),
-                                                                         "key": step_functions.JsonPath.string_at("$.detail.requestParameters.key")
-                                                                     }
-                                                                 ))
-
-        submit_errors_job = step_functions_tasks.BatchSubmitJob(self, 'Submit errors calculation job',
-                                                                job_name='ErrorsCalculation',
-                                                                job_queue_arn=errors_job_queue.job_queue_arn,
-                                                                job_definition_arn=errors_job_definition.job_definition_arn,
-                                                                payload=step_functions.TaskInput.from_object(
-                                                                    {
-                                                                        "indexed_data_sources_bucket": step_functions.JsonPath.string_at(
-                                                                            "$.detail.requestParameters.bucketName"),
-                                                                        "key": step_functions.JsonPath.string_at(
-                                                                            "$.detail.requestParameters.key")
-                                                                    }
-                                                                ))
-
-        map_task = step_functions.Parallel(self, 'Run analysis in parallel')\
+                               errors_job_queue, errors_job_definition, merge_function):
+        # Large groups of files are split in shards, analysed by the children of an array job, and the results of the
+        # shards are merged afterwards. Smaller groups are analysed by a single job, which uploads the results itself
+        submit_metrics_job = self.__create_submit_analysis_job_task('Submit metrics calculation job',
+                                                                    'MetricsCalculation',
+                                                                    metrics_job_queue, metrics_job_definition,
+                                                                    constants.ANALYSIS_SHARDS)
+        submit_errors_job = self.__create_submit_analysis_job_task('Submit errors calculation job',
+                                                                   'ErrorsCalculation',
+                                                                   errors_job_queue, errors_job_definition,
+                                                                   constants.ANALYSIS_SHARDS)
+        submit_single_metrics_job = self.__create_submit_analysis_job_task('Submit single metrics calculation job',
+                                                                           'MetricsCalculation',
+                                                                           metrics_job_queue, metrics_job_definition)
+        submit_single_errors_job = self.__create_submit_analysis_job_task('Submit single errors calculation job',
+                                                                          'ErrorsCalculation',
+                                                                          errors_job_queue, errors_job_definition)
+
+        map_task = step_functions.Parallel(self, 'Run analysis in parallel',
+                                           result_path=step_functions.JsonPath.DISCARD)\
             .branch(submit_metrics_job)\
             .branch(submit_errors_job)
 
+        single_map_task = step_functions.Parallel(self, 'Run single analysis in parallel',
+                                                  result_path=step_functions.JsonPath.DISCARD)\
+            .branch(submit_single_metrics_job)\
+            .branch(submit_single_errors_job)
+
+        merge_task = step_functions_tasks.LambdaInvoke(self, 'Merge analysis results',
+                                                       lambda_function=merge_function,
+                                                       payload=step_functions.TaskInput.from_object(
+                                                           {
+                                                               "keys": step_functions.JsonPath.list_at("$.keys"),
+                                                               "run_id": step_functions.JsonPath.string_at(
+                                                                   "$$.Execution.Name")
+                                                           }
+                                                       ),
+                                                       output_path='$.Payload')
+
         state_machine = step_functions.StateMachine(self, 'DataSourceAnalysis',
                                                     state_machine_name='DataSourceAnalysis',
-                                                    definition=map_task)
+                                                    definition=step_functions.Choice(self, 'Shard the files?')
+                                                    .when(step_functions.Condition.and_(
+                                                        step_functions.Condition.is_present('$.shards'),
+                                                        step_functions.Condition.number_greater_than('$.shards', 1)),
+                                                        map_task.next(merge_task))
+                                                    .otherwise(single_map_task))
         state_machine.add_to_role_policy(iam.PolicyStatement(effect=iam.Effect.ALLOW,
                                                              actions=['batch:SubmitJob'],
                                                              resources=[metrics_job_queue.job_queue_arn,
@@ -385,7 +591,15 @@ jq -r '.Parameter.Value')"
 
         return state_machine
 
-    def __create_state_machine_trigger_rule(self, bucket_to_listen, state_machine: step_functions.StateMachine):
+    def __create_state_machine_trigger_components(self, bucket_to_listen, state_machine: step_functions.StateMachine):
+        # Files indexed within a time window are grouped by a Lambda function, which starts one analysis per group
+        queue = sqs.Queue(self, 'IndexedDataSourcesQueue',
+                          queue_name='indexed-data-sources',
+                          visibility_timeout=Duration.minutes(6))
+
+        Tags.of(queue).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(queue).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
         rule = events.Rule(self, 'DataSourceIndexedRule',
                            rule_name='DataSourceIndexedRule',
                            event_pattern=events.EventPattern(
@@ -400,12 +614,45 @@ jq -r '.Parameter.Value')"
                                }
                            ),
                            targets=[
-                               events_targets.SfnStateMachine(machine=state_machine)
+                               events_targets.SqsQueue(queue)
                            ])
 
         Tags.of(rule).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
         Tags.of(rule).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
 
+        # Create the log group so that it's cleaned when deleting the stack
+        log_group = logs.LogGroup(self, 'StartDataSourceAnalysisFunctionLogGroup',
+                                  log_group_name='/aws/lambda/startDataSourceAnalysis',
+                                  removal_policy=RemovalPolicy.DESTROY,
+                                  retention=logs.RetentionDays.SIX_MONTHS)
+
+        Tags.of(log_group).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(log_group).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
+        function = _lambda.Function(self, 'StartDataSourceAnalysisFunction',
+                                    function_name='startDataSourceAnalysis',
+                                    handler='index.handler',
+                                    runtime=_lambda.Runtime.PYTHON_3_9,
+                                    timeout=Duration.minutes(1),
+                                    code=_lambda.Code.from_asset('assets/func_start_data_source_analysis'),
+                                    layers=[self.node.scope.global_resources_stack.layer],
+                                    environment={
+                                        'STATE_MACHINE_ARN': state_machine.state_machine_arn
+                                    })
+
+        function.add_event_source(lambda_event_sources.SqsEventSource(
+            queue,
+            batch_size=constants.ANALYSIS_BATCH_MAX_FILES,
+            max_batching_window=Duration.minutes(constants.ANALYSIS_BATCH_WINDOW_MINUTES)))
+
+        # The size of the files is read to decide whether they are split in shards
+        bucket_to_listen.grant_read(function)
+        state_machine.grant_start_execution(function)
+        function.node.add_dependency(log_group)
+
+        Tags.of(function).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(function).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
     def __create_auto_delete_ecr_images_custom_resource(self, metrics_ecr_repository: ecr.Repository,
                                                         errors_ecr_repository: ecr.Repository):
         with open('assets/func_auto_delete_ecr_images/index.py') as fd:
@@ -440,6 +687,8 @@ jq -r '.Parameter.Value')"
         config_files_bucket = self.node.scope.global_resources_stack.config_files_bucket
 
         self.analysis_results_bucket = self.__create_s3_bucket()
+        analysis_cache_bucket = self.__create_analysis_cache_bucket()
+        partial_results_bucket = self.__create_partial_results_bucket()
         self.__create_s3_object_level_events_trail(self.analysis_results_bucket)
 
         metrics_pipeline = self.__create_metrics_dev_tools()
@@ -448,17 +697,25 @@ jq -r '.Parameter.Value')"
                                                                                        vpc,
                                                                                        indexed_data_sources_bucket,
                                                                                        self.analysis_results_bucket,
-                                                                                       config_files_bucket)
+                                                                                       config_files_bucket,
+                                                                                       analysis_cache_bucket,
+                                                                                       partial_results_bucket)
 
         errors_pipeline = self.__create_errors_dev_tools()
 
         errors_queue, errors_definition = self.__create_errors_aws_batch_components(errors_pipeline.ecr_repository,
                                                                                     vpc,
                                                                                     indexed_data_sources_bucket,
-                                                                                    self.analysis_results_bucket)
+                                                                                    self.analysis_results_bucket,
+                                                                                    analysis_cache_bucket,
+                                                                                    partial_results_bucket)
+
+        merge_function = self.__create_merge_analysis_results_lambda(partial_results_bucket,
+                                                                     self.analysis_results_bucket)
 
-        state_machine = self.__create_state_machine(metrics_queue, metrics_definition, errors_queue, errors_definition)
-        self.__create_state_machine_trigger_rule(indexed_data_sources_bucket, state_machine)
+        state_machine = self.__create_state_machine(metrics_queue, metrics_definition, errors_queue, errors_definition,
+                                                    merge_function)
+        self.__create_state_machine_trigger_components(indexed_data_sources_bucket, state_machine)
 
         self.__create_auto_delete_ecr_images_custom_resource(metrics_pipeline.ecr_repository,
                                                              errors_pipeline.ecr_repository)
@@ -28,6 +28,11 @@ from assets.system_lambda_layer.python.language_analysis import tags
 
 
 class DataSourceIndexationStack(NestedStack):
+    # Context key that enables validating and indexing each data source file with a single function, reading it once
+    __SINGLE_PASS_CONTEXT_KEY = 'singlePassIndexation'
+    # Days after which the parts of the multipart uploads left by failed functions are deleted
+    __INCOMPLETE_MULTIPART_UPLOAD_DAYS = 1
+
     def __create_invalid_data_sources_bucket(self):
         bucket = s3.Bucket(self, 'InvalidDataSourcesBucket',
                            bucket_name='invalid-data-sources-' + self.node.scope.stack_id_termination,
@@ -70,7 +75,9 @@ class DataSourceIndexationStack(NestedStack):
         bucket = s3.Bucket(self, 'IndexedDataSourcesBucket',
                            bucket_name='indexed-data-sources-' + self.node.scope.stack_id_termination,
                            removal_policy=RemovalPolicy.DESTROY,
-                           auto_delete_objects=True)
+                           auto_delete_objects=True,
+                           lifecycle_rules=[s3.LifecycleRule(abort_incomplete_multipart_upload_after=Duration.days(
+                               self.__INCOMPLETE_MULTIPART_UPLOAD_DAYS))])
 
         Tags.of(bucket).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
         Tags.of(bucket).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_INDEXATION)
@@ -141,7 +148,7 @@ class DataSourceIndexationStack(NestedStack):
         )
 
         function.add_to_role_policy(
-            iam.PolicyStatement(actions=['ssm:GetParameter'],
+            iam.PolicyStatement(actions=['ssm:GetParameter', 'ssm:GetParametersByPath'],
                                 resources=['arn:aws:ssm:*:{}:parameter/{}*'.format(self.account,
                                                                                    constants.SSM_PARAMS_PATH)])
         )
@@ -172,20 +179,84 @@ class DataSourceIndexationStack(NestedStack):
                                     code=lambda_.Code.from_asset('assets/func_index_data_source_file'),
                                     layers=[layer],
                                     retry_attempts=0,
-                                    memory_size=1024)
+                                    memory_size=1024,
+                                    environment={
+                                        'BULK_CHUNK_SIZE': str(constants.BULK_CHUNK_SIZE),
+                                        'BULK_MAX_CHUNK_BYTES': str(constants.BULK_MAX_CHUNK_BYTES),
+                                        'BULK_THREAD_COUNT': str(constants.BULK_THREAD_COUNT)
+                                    })
 
         function.add_to_role_policy(
             iam.PolicyStatement(actions=['s3:GetObject'],
                                 resources=[data_sources_bucket.bucket_arn + '/*'])
         )
 
+        # The upload of the documents is aborted when they cannot be indexed
+        function.add_to_role_policy(
+            iam.PolicyStatement(actions=['s3:PutObject', 's3:AbortMultipartUpload'],
+                                resources=[indexed_data_sources_bucket.bucket_arn + '/*'])
+        )
+
+        function.add_to_role_policy(
+            iam.PolicyStatement(actions=['ssm:GetParameter', 'ssm:GetParametersByPath'],
+                                resources=['arn:aws:ssm:*:{}:parameter/{}*'.format(self.account,
+                                                                                   constants.SSM_PARAMS_PATH)])
+        )
+
+        function.node.add_dependency(log_group)
+
+        Tags.of(function).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(function).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_INDEXATION)
+
+        domain.grant_write(function)
+
+        return function
+
+    def __create_data_source_file_validation_and_indexation_lambda(self, layer, data_sources_bucket,
+                                                                   invalid_data_sources_bucket,
+                                                                   indexed_data_sources_bucket, domain):
+        # Create the log group so that it's cleaned when deleting the stack
+        log_group = logs.LogGroup(self, 'DataSourceFileValidationAndIndexationFunctionLogGroup',
+                                  log_group_name='/aws/lambda/validateAndIndexDataSourceFile',
+                                  removal_policy=RemovalPolicy.DESTROY,
+                                  retention=logs.RetentionDays.SIX_MONTHS)
+
+        Tags.of(log_group).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(log_group).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_INDEXATION)
+
+        function = lambda_.Function(self, 'DataSourceFileValidationAndIndexationFunction',
+                                    function_name='validateAndIndexDataSourceFile',
+                                    handler='index.validate_and_index_handler',
+                                    runtime=lambda_.Runtime.PYTHON_3_9,
+                                    timeout=Duration.minutes(15),
+                                    code=lambda_.Code.from_asset('assets/func_index_data_source_file'),
+                                    layers=[layer],
+                                    retry_attempts=0,
+                                    memory_size=1024,
+                                    environment={
+                                        'BULK_CHUNK_SIZE': str(constants.BULK_CHUNK_SIZE),
+                                        'BULK_MAX_CHUNK_BYTES': str(constants.BULK_MAX_CHUNK_BYTES),
+                                        'BULK_THREAD_COUNT': str(constants.BULK_THREAD_COUNT)
+                                    })
+
+        function.add_to_role_policy(
+            iam.PolicyStatement(actions=['s3:GetObject', 's3:DeleteObject'],
+                                resources=[data_sources_bucket.bucket_arn + '/*'])
+        )
+
         function.add_to_role_policy(
-            iam.PolicyStatement(actions=['s3:PutObject'],
+            iam.PolicyStatement(actions=['s3:*'],
+                                resources=[invalid_data_sources_bucket.bucket_arn + '/*'])
+        )
+
+        # The upload of the documents is aborted when the file is invalid
+        function.add_to_role_policy(
+            iam.PolicyStatement(actions=['s3:PutObject', 's3:AbortMultipartUpload'],
                                 resources=[indexed_data_sources_bucket.bucket_arn + '/*'])
         )
 
         function.add_to_role_policy(
-            iam.PolicyStatement(actions=['ssm:GetParameter'],
+            iam.PolicyStatement(actions=['ssm:GetParameter', 'ssm:GetParametersByPath'],
                                 resources=['arn:aws:ssm:*:{}:parameter/{}*'.format(self.account,
                                                                                    constants.SSM_PARAMS_PATH)])
         )
@@ -199,6 +270,30 @@ class DataSourceIndexationStack(NestedStack):
 
         return function
 
+    def __create_single_pass_state_machine(self, validation_and_indexation_function):
+        validation_fail_task = step_functions.Fail(self, 'Validation failed')
+        succeeded_task = step_functions.Succeed(self, 'Indexation succeeded')
+        indexation_fail_task = step_functions.Fail(self, 'Indexation failed')
+
+        validation_and_indexation_task = step_functions_tasks. \
+            LambdaInvoke(self, 'Validate and index data source file',
+                         lambda_function=validation_and_indexation_function,
+                         output_path='$.Payload')
+
+        # Invalid files fail in the same state as when they are validated by a function of their own
+        validation_and_indexation_task.next(succeeded_task)
+        validation_and_indexation_task.add_catch(handler=validation_fail_task, errors=['ValidationException'])
+        validation_and_indexation_task.add_catch(handler=indexation_fail_task)
+
+        state_machine = step_functions.StateMachine(self, 'DataSourceIndexation',
+                                                    state_machine_name='DataSourceIndexation',
+                                                    definition=validation_and_indexation_task)
+
+        Tags.of(state_machine).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(state_machine).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_INDEXATION)
+
+        return state_machine
+
     def __create_state_machine(self, validation_function, indexation_function):
         validation_fail_task = step_functions.Fail(self, 'Validation failed')
         succeeded_task = step_functions.Succeed(self, 'Indexation succeeded')
@@ -262,14 +357,25 @@ class DataSourceIndexationStack(NestedStack):
 
         self.__create_s3_object_level_events_trail(data_sources_bucket, self.indexed_data_sources_bucket)
 
-        validation_function = self.__create_data_source_file_validation_lambda(layer,
-                                                                               data_sources_bucket,
-                                                                               invalid_data_sources_bucket)
+        if str(self.node.try_get_context(self.__SINGLE_PASS_CONTEXT_KEY)).lower() == 'true':
+            validation_and_indexation_function = self.\
+                __create_data_source_file_validation_and_indexation_lambda(layer,
+                                                                           data_sources_bucket,
+                                                                           invalid_data_sources_bucket,
+                                                                           self.indexed_data_sources_bucket,
+                                                                           domain)
+
+            state_machine = self.__create_single_pass_state_machine(validation_and_indexation_function)
+        else:
+            validation_function = self.__create_data_source_file_validation_lambda(layer,
+                                                                                   data_sources_bucket,
+                                                                                   invalid_data_sources_bucket)
+
+            indexation_function = self.__create_data_source_file_indexation_lambda(layer,
+                                                                                   data_sources_bucket,
+                                                                                   self.indexed_data_sources_bucket,
+                                                                                   domain)
 
-        indexation_function = self.__create_data_source_file_indexation_lambda(layer,
-                                                                               data_sources_bucket,
-                                                                               self.indexed_data_sources_bucket,
-                                                                               domain)
+            state_machine = self.__create_state_machine(validation_function, indexation_function)
 
-        state_machine = self.__create_state_machine(validation_function, indexation_function)
         self.__create_state_machine_trigger_rule(data_sources_bucket, state_machine)
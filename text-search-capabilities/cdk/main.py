@@ -28,6 +28,10 @@ class LanguageAnalysisStack(Stack):
 the language analysis will be faster. If you choose Accuracy, the results will be more accurate but \
 the analysis will take longer to complete.'
     __LANG_PARAM_DESC = 'Language of the data sources to analyse.'
+    __ERRORS_PROFILE_PARAM_DESC = 'Rules checked by the errors analysis. By choosing a profile other than full, \
+only some categories of rules are checked and the analysis is faster.'
+    __ERRORS_PROFILE_BY_SOURCE_DESC = 'JSON object with the errors profile of the data sources whose profile is not \
+the default one, by source (root folder of the data source files).'
 
     @property
     def stack_id_termination(self):
@@ -66,6 +70,31 @@ the analysis will take longer to complete.'
         Tags.of(language_ssm).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
         Tags.of(language_ssm).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
 
+        errors_profile = CfnParameter(self, 'errorsProfile',
+                                      default=constants.ERRORS_PROFILE_FULL,
+                                      description=self.__ERRORS_PROFILE_PARAM_DESC,
+                                      allowed_values=constants.ERRORS_PROFILES,
+                                      type='String')
+
+        errors_profile_ssm = ssm.StringParameter(self, 'ErrorsProfileParamSSM',
+                                                 parameter_name=constants.CONFIG_PARAM_ERRORS_PROFILE,
+                                                 string_value=errors_profile.value_as_string,
+                                                 description=self.__ERRORS_PROFILE_PARAM_DESC)
+
+        Tags.of(errors_profile_ssm).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(errors_profile_ssm).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
+        errors_profile_by_source_ssm = ssm.StringParameter(self, 'ErrorsProfileBySourceParamSSM',
+                                                           parameter_name=constants.
+                                                           CONFIG_PARAM_ERRORS_PROFILE_BY_SOURCE,
+                                                           string_value='{}',
+                                                           description='{} Profiles must be one of: {}.'.
+                                                           format(self.__ERRORS_PROFILE_BY_SOURCE_DESC,
+                                                                  ', '.join(constants.ERRORS_PROFILES)))
+
+        Tags.of(errors_profile_by_source_ssm).add(tags.TAG_ENVIRONMENT, tags.CURRENT_ENVIRONMENT)
+        Tags.of(errors_profile_by_source_ssm).add(tags.TAG_MODULE, tags.MODULE_DATA_SOURCE_ANALYSIS)
+
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
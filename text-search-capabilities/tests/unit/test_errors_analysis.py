@@ -0,0 +1,143 @@
+import importlib.util
+import os
+import sys
+import threading
+
+from language_tool_python.match import Match
+
+ASSETS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'assets')
+ERRORS_PATH = os.path.join(ASSETS_PATH, 'data_source_analysis', 'errors')
+SHARED_MODULES_PATH = os.path.join(ASSETS_PATH, 'data_source_analysis', 'shared')
+LAYER_MODULES_PATH = os.path.join(ASSETS_PATH, 'system_lambda_layer', 'python')
+
+
+def load_errors_script():
+    """
+    Imports the index.py script of the errors job, with the modules copied next to it in its image. The folder of the
+    Lambda layer is searched last, so the dependencies bundled with it do not replace the installed ones
+    """
+    for modules_path in [SHARED_MODULES_PATH, ERRORS_PATH]:
+        if modules_path not in sys.path:
+            sys.path.insert(0, modules_path)
+
+    if LAYER_MODULES_PATH not in sys.path:
+        sys.path.append(LAYER_MODULES_PATH)
+
+    spec = importlib.util.spec_from_file_location('errors_index', os.path.join(ERRORS_PATH, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+errors = load_errors_script()
+
+TYPO = 'teh'
+
+
+class TypoChecker:
+    """
+    Stands in for the LanguageTool server, reporting each occurrence of TYPO with its offset in UTF-16 code units, as
+    the server does
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def check(self, text: str) -> [Match]:
+        self.requests.append(text)
+        units = text.encode('utf-16-le')
+        typo = TYPO.encode('utf-16-le')
+        matches = []
+        position = units.find(typo)
+
+        while position >= 0:
+            matches.append(Match({
+                'message': 'Possible spelling mistake found.',
+                'replacements': [{'value': 'the'}],
+                'offset': position // 2,
+                'length': len(TYPO),
+                'context': {'text': 'context of the joined texts', 'offset': 0, 'length': len(TYPO)},
+                'rule': {'id': 'MORFOLOGIK_RULE_EN_US', 'issueType': 'misspelling',
+                         'category': {'id': 'TYPOS', 'name': 'Possible Typo'}}
+            }))
+            position = units.find(typo, position + len(typo))
+
+        return matches
+
+
+def utf16_slice(text: str, from_pos: int, to_pos: int) -> str:
+    return text.encode('utf-16-le')[from_pos * 2:to_pos * 2].decode('utf-16-le')
+
+
+def test_matches_located_after_emoji():
+    texts = ['😀😀 ' + TYPO + ' cat', 'A dog 🐶' + TYPO + ' 👍', TYPO]
+    checker = TypoChecker()
+
+    located = errors.locate_matches(checker, texts)
+
+    assert len(checker.requests) == 1
+    assert [[(from_pos, to_pos) for _, from_pos, to_pos in matches] for matches in located] == [[(5, 8)], [(8, 11)],
+                                                                                              [(0, 3)]]
+
+    for text, matches in zip(texts, located):
+        for _, from_pos, to_pos in matches:
+            assert utf16_slice(text, from_pos, to_pos) == TYPO
+
+
+def test_batch_errors_have_the_context_of_their_text():
+    texts = ['😀\t' + TYPO + '\r\nend', 'Nothing to see 🐶', '🐶🐶🐶 ' + TYPO + '\n']
+
+    batch_errors = errors.find_language_errors_in_batch(TypoChecker(), texts)
+
+    assert [[error['context'] for error in text_errors] for text_errors in batch_errors] == [
+        ['😀 ' + TYPO + '  end'], [], ['🐶🐶🐶 ' + TYPO + ' ']]
+    assert batch_errors[0][0]['rule-id'] == 'MORFOLOGIK_RULE_EN_US'
+    assert batch_errors[0][0]['replacement'] == 'the'
+
+
+def test_context_cut_around_emoji():
+    text = '🐶' * 30 + '  ' + TYPO + ' ' + 'x' * 50
+    from_pos = errors.utf16_length('🐶' * 30 + '  ')
+
+    # The 40 code units before the error are two spaces and 19 emoji, since each one takes two code units
+    assert errors.build_context(text, from_pos, from_pos + len(TYPO)) == \
+        '...' + '🐶' * 19 + '  ' + TYPO + ' ' + 'x' * 39 + '...'
+
+    # When the window starts in the middle of an emoji, the context keeps its second half, as the server does
+    assert errors.build_context(text, from_pos - 1, from_pos - 1 + len(TYPO)).startswith('...\udc36' + '🐶' * 19)
+
+
+def test_servers_started_at_the_same_time_on_distinct_ports(monkeypatch):
+    started = []
+    starting = threading.Barrier(3, timeout=5)
+
+    def start_server(checker, language):
+        # Each server waits for the others, so the pool only starts if their servers are started at the same time
+        starting.wait()
+        started.append(checker._port)
+
+    monkeypatch.setattr(errors, 'download_lt', lambda: None)
+    monkeypatch.setattr(errors.langtool.LanguageTool, '__init__', start_server)
+    monkeypatch.setattr(errors.langtool.LanguageTool, 'close', lambda checker: None)
+
+    pool = errors.start_language_tool_pool('en-US', 3)
+
+    assert pool.size == 3
+    assert sorted(checker._port for checker in pool.checkers) == sorted(started)
+    assert len(set(started)) == 3
+    assert errors.langtool.LanguageTool._port == errors.langtool.LanguageTool._MIN_PORT
+
+
+def test_sentences_in_flight_checked_once():
+    documents = [{'text': 'Shared ' + TYPO + ' sentence. Sentence {}.'.format(i)} for i in range(3)]
+    checker = TypoChecker()
+    sentences = errors.sentence_cache.SentenceCache(100, ['errors', 'sentences'])
+
+    # Each document is checked in its own batch, and all of them are sent before the first check is resolved
+    checked = list(errors.check_documents(checker, documents, max_pending=3, sentences=sentences))
+
+    assert sorted(sentence for request in checker.requests for sentence in request.split('\n\n')) == \
+        sorted(['Shared ' + TYPO + ' sentence.', 'Sentence 0.', 'Sentence 1.', 'Sentence 2.'])
+    assert [[error['context'] for error in document_errors] for _, document_errors in checked] == \
+        [['Shared ' + TYPO + ' sentence. Sentence {}.'.format(i)] for i in range(3)]
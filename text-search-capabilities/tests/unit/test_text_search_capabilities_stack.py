@@ -1,15 +1,13 @@
 import aws_cdk as core
 import aws_cdk.assertions as assertions
 
-from text_search_capabilities.text_search_capabilities_stack import TextSearchCapabilitiesStack
+from cdk.main import LanguageAnalysisStack
 
-# example tests. To run these tests, uncomment this file along with the example
-# resource in text_search_capabilities/text_search_capabilities_stack.py
-def test_sqs_queue_created():
+
+def test_nested_stacks_created():
     app = core.App()
-    stack = TextSearchCapabilitiesStack(app, "text-search-capabilities")
+    stack = LanguageAnalysisStack(app, "LanguageAnalysis")
     template = assertions.Template.from_stack(stack)
 
-#     template.has_resource_properties("AWS::SQS::Queue", {
-#         "VisibilityTimeout": 300
-#     })
+    # Global resources, data source indexation, data source analysis and analysis results indexation
+    template.resource_count_is("AWS::CloudFormation::Stack", 4)
@@ -0,0 +1,48 @@
+import json
+
+from assets.data_source_analysis.shared import work_queue
+
+
+def message(key: str) -> str:
+    return json.dumps({'bucket': 'indexed-data-sources', 'key': key})
+
+
+def test_files_processed_in_order_of_arrival(tmp_path):
+    queue = work_queue.FileWorkQueue(str(tmp_path))
+    keys = ['source/{}.jsonl'.format(i) for i in range(5)]
+
+    for key in keys:
+        queue.send(message(key))
+
+    processed = []
+    stats = work_queue.consume(queue, lambda bucket, key: processed.append(key), idle_timeout=0.1)
+
+    assert processed == keys
+    assert stats == {'processed': 5, 'failed': 0}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_files_are_not_acknowledged():
+    queue = work_queue.InMemoryWorkQueue([message('source/0.jsonl'), message('source/1.jsonl'), 'not json',
+                                          message('source/2.jsonl')])
+    processed = []
+
+    def process(bucket: str, key: str):
+        if key == 'source/1.jsonl':
+            raise ValueError('invalid file')
+
+        processed.append(key)
+
+    stats = work_queue.consume(queue, process, idle_timeout=0.01)
+
+    # The worker keeps consuming after a failure, and the failed messages are left to be retried
+    assert processed == ['source/0.jsonl', 'source/2.jsonl']
+    assert stats == {'processed': 2, 'failed': 2}
+    assert sorted(queue.unacknowledged.values()) == sorted([message('source/1.jsonl'), 'not json'])
+
+
+def test_cloudtrail_event_message():
+    body = json.dumps({'detail': {'requestParameters': {'bucketName': 'indexed-data-sources',
+                                                        'key': 'source/0.jsonl'}}})
+
+    assert work_queue.parse_message(body) == ('indexed-data-sources', 'source/0.jsonl')